@@ -21,11 +21,23 @@ def getAction():
 	return random.randint(0, 3)
 
 
+# sets the parameters and chooses the action with a single call
+# returns the action, wether a new level is requested (boolean) and the action counter
+def step(params):
+	action = getAction()
+	return action, getReload(), ACTION_COUNT
+
+
 # sets the global SCREENSHOT_FILEPATH in lua
 def setScreenshotPath(path):
 	return path # for debugging
 
 
+# sets the global OBSERVATION_CHANNEL_PATH in lua (the random agent doesn't read the screen)
+def setObservationChannelPath(path):
+	return path # for debugging
+
+
 # returns wether the AI requested a new level to be loaded (boolean)
 def getReload():
 	return ACTION_COUNT % 1000 == 0
@@ -3,6 +3,9 @@ local aiconnector = {}
 -- parameters
 aiconnector.PARAMS = {}
 
+-- names of the parameters given to step(), in that order (same as PARAM_NAMES in AIConnector.py)
+aiconnector.PARAM_NAMES = {"score", "x", "xDistanceToGoal", "distanceToGoal", "deathCount", "levelBeatenCount", "worldname", "historyMoveSum"}
+
 -- files that have been opened
 aiconnector.OPEN_FILES = {}
 
@@ -17,6 +20,19 @@ function aiconnector.getAction()
 end
 
 
+-- one call per frame: sets the parameters (the PARAMS table is reused) and runs the AI
+-- returns the action id, wether the AI requested a new level and the action counter
+function aiconnector.step(...)
+    local params = aiconnector.PARAMS
+    for i, name in ipairs(aiconnector.PARAM_NAMES) do
+        params[name] = (select(i, ...))
+    end
+    params.reload = nil
+    on_frame_emulated()
+    return actions.NEXT_ACTION, params.reload == true, STATS.ACTION_COUNTER
+end
+
+
 -- if the AI wants a new level, it will set PARAMS.reload to true, which is forwarded to python by this method
 function aiconnector.getReload()
     return aiconnector.PARAMS.reload == true -- comparison will turn nil into false for python
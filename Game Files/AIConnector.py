@@ -13,6 +13,9 @@ LG = lua.globals()
 # loads the AI
 LG.dofile(PATH_TO_LUA_MAIN)
 
+# names of the parameters in the order they are given to aiconnector.step (same as PARAM_NAMES in AIConnector.lua)
+PARAM_NAMES = ("score", "x", "xDistanceToGoal", "distanceToGoal", "deathCount", "levelBeatenCount", "worldname", "historyMoveSum")
+
 
 # calls setParams in AIConnector.lua
 # giving the dict as argument is possible, but it won't be a lua table then, which could cause trouble
@@ -32,6 +35,13 @@ def setParams(params):
 	return cmd
 
 
+# calls step() in AIConnector.lua: sets the parameters and runs the AI with a single call
+# the parameters are given as arguments in the order of PARAM_NAMES (missing ones are nil), lua puts them into a reused table
+# returns the action, wether the AI requested a new level (boolean) and the action counter
+def step(params):
+	return LG.aiconnector.step(*[params.get(name) for name in PARAM_NAMES])
+
+
 # calls the getAction() method from AIConnector.lua and forwards its return value
 def getAction():
 	return LG.aiconnector.getAction()
@@ -43,6 +53,13 @@ def setScreenshotPath(path):
 	return path # for debugging
 
 
+# sets the global OBSERVATION_CHANNEL_PATH in lua
+# if set, the AI reads the screens from this observation channel (see observationChannel.py) instead of SCREENSHOT_FILEPATH
+def setObservationChannelPath(path):
+	LG.OBSERVATION_CHANNEL_PATH = path
+	return path # for debugging
+
+
 # returns wether the AI requested a new level to be loaded (boolean)
 def getReload():
 	return LG.aiconnector.getReload()
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import struct
+from collections import namedtuple
+
+from simulation import Simulation
+from worldSaver import getLevelFile
+
+
+'''
+Action log: records every episode (one level, from loading it until the goal is reached or a new level is loaded) as
+the level, the seed of the episode and the actions of all ticks, so the episode can be simulated again later (see replayEpisode).
+
+File layout (all numbers little endian):
+	header: magic (4 bytes), version (uint16)
+	episodes: seed (uint64), length of the level path (uint16), number of actions (uint32), level path (utf-8), one byte per action
+'''
+MAGIC = b"ACTL"
+VERSION = 1
+HEADER_FORMAT = "<4sH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+EPISODE_FORMAT = "<QHI"
+EPISODE_SIZE = struct.calcsize(EPISODE_FORMAT)
+
+# one recorded episode, actions is a bytes object with one action per tick
+Episode = namedtuple('Episode', ['level', 'seed', 'actions'])
+
+
+# records episodes to the action log at the given path (episodes are appended if the file already exists)
+class ActionLogWriter:
+
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, "ab")
+		if self.file.tell() == 0:
+			self.file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION))
+		self.level = None
+		self.seed = None
+		self.actions = bytearray()
+
+	# starts a new episode, the previous one is written
+	def beginEpisode(self, level, seed):
+		self.endEpisode()
+		self.level = level
+		self.seed = seed if seed is not None else 0
+
+	# records the action of one tick
+	def addAction(self, action):
+		self.actions.append(action)
+
+	# writes the current episode (if there is one), episodes without actions are skipped (like in the statistics file)
+	def endEpisode(self):
+		if (self.level is None) or (not self.actions):
+			self.level = None
+			return
+		level = self.level.encode("utf-8")
+		self.file.write(struct.pack(EPISODE_FORMAT, self.seed, len(level), len(self.actions)))
+		self.file.write(level)
+		self.file.write(self.actions)
+		self.level = None
+		self.actions = bytearray()
+
+	def close(self):
+		self.endEpisode()
+		self.file.close()
+
+
+# reads the episodes from an action log created by ActionLogWriter
+class ActionLogReader:
+
+	def __init__(self, path):
+		self.path = path
+
+	# yields all episodes in the order they were recorded
+	def __iter__(self):
+		f = open(self.path, "rb")
+		try:
+			magic, version = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+			if (magic != MAGIC) or (version != VERSION):
+				raise IOError("{} is not an action log (version {})!".format(self.path, VERSION))
+			while True:
+				head = f.read(EPISODE_SIZE)
+				if len(head) < EPISODE_SIZE: # end of file (or an episode that was cut off)
+					break
+				seed, levelLength, actionCount = struct.unpack(EPISODE_FORMAT, head)
+				level = f.read(levelLength).decode("utf-8")
+				actions = f.read(actionCount)
+				if len(actions) < actionCount:
+					break
+				yield Episode(level, seed, actions)
+		finally:
+			f.close()
+
+
+# simulates a recorded episode again without any graphics
+# callback(sim, action, flags) is called after every tick, e.g. to create the observations
+# returns the simulation in the state at the end of the episode
+def replayEpisode(episode, sim=None, callback=None):
+	sim = sim if sim is not None else Simulation()
+	sim.reset(episode.level, episode.seed)
+	for action in bytearray(episode.actions):
+		flags = sim.tick(action)
+		if callback:
+			callback(sim, action, flags)
+	return sim
+
+
+# main
+# replays all episodes of the given action log and prints their statistics (same order as in the statistics file of the game)
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python actionLog.py <action log>")
+		sys.exit(1)
+	sim = Simulation()
+	start = time.time()
+	ticks = 0
+	episodes = 0
+	print(";".join(["episode", "seed", "frames", "coins collected", "deaths", "levels beaten", "score", "!world name"]))
+	for i, episode in enumerate(ActionLogReader(sys.argv[1])):
+		if not os.path.isfile(getLevelFile(episode.level)):
+			print("{};{};level not found;{}".format(i, episode.seed, episode.level))
+			continue
+		replayEpisode(episode, sim)
+		ticks += len(episode.actions)
+		episodes += 1
+		print(";".join(map(str, [i, episode.seed, len(episode.actions), sim.coinCount, sim.deathCount, sim.levelCount, sim.score, episode.level])))
+	duration = time.time() - start
+	print("{} episodes with {} frames replayed in {:.2f}s ({:.0f} frames per second)".format(episodes, ticks, duration, ticks / max(duration, 1e-9)))
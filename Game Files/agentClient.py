@@ -0,0 +1,148 @@
+import socket
+import struct
+
+from agentServer import packRequest, frame, REPLY_FORMAT, REPLY_SIZE, LENGTH_SIZE, OBSERVATION_NONE, OBSERVATION_RAW, OBSERVATION_PNG
+
+
+# connection to an agent server
+# a request is sent with submit() and its reply is read with collect(), so other work can be done while the agent chooses the action
+class AgentConnection:
+
+	def __init__(self, path):
+		self.path = path
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.connect(path)
+
+	# sends the parameters and the observation of one frame (see agentServer.packRequest)
+	def submit(self, params, worldCount, observationFormat=OBSERVATION_NONE, shape=(0, 0, 0), observation=b""):
+		self.socket.sendall(frame(packRequest(params, worldCount, observationFormat, shape, observation)))
+
+	# waits for the reply to the last request
+	# returns the action, wether the agent requested a new level (boolean) and the action counter
+	def collect(self):
+		size = LENGTH_SIZE + REPLY_SIZE
+		data = bytearray(size)
+		view = memoryview(data)
+		received = 0
+		while received < size:
+			n = self.socket.recv_into(view[received:])
+			if n == 0:
+				raise IOError("The agent server at {} closed the connection!".format(self.path))
+			received += n
+		action, reload, actionCount = struct.unpack_from(REPLY_FORMAT, data, LENGTH_SIZE)
+		return action, reload == 1, actionCount
+
+	def close(self):
+		self.socket.close()
+
+
+# CLIENT FOR AN AGENT SERVER (see agentServer.py), SAME INTERFACE AS AIConnector.py
+# the observation is taken from where the AI would read it: the observation channel (if set) or the screenshot file
+
+# path of the socket of the agent server (connect() sets it, otherwise the server is connected on the first step)
+SERVER_PATH = r"/tmp/agentServer.sock"
+
+CONNECTION = None
+SCREENSHOT_PATH = None
+OBSERVATION_CHANNEL_PATH = None
+OBSERVATION_READER = None
+PARAMS = None
+RELOAD = False
+ACTION_COUNT = 0
+WORLD_COUNT = 0
+
+
+# connects to the agent server at the given path
+def connect(path=None):
+	global CONNECTION, SERVER_PATH
+	SERVER_PATH = path if path is not None else SERVER_PATH
+	CONNECTION = AgentConnection(SERVER_PATH)
+	return SERVER_PATH
+
+
+# returns the current observation as (format, shape, bytes)
+def getObservation():
+	global OBSERVATION_READER
+	if OBSERVATION_CHANNEL_PATH:
+		if OBSERVATION_READER is None:
+			from observationChannel import ObservationReader
+			OBSERVATION_READER = ObservationReader(OBSERVATION_CHANNEL_PATH)
+		observation = OBSERVATION_READER.read(copy=False)
+		if observation is not None:
+			return OBSERVATION_RAW, OBSERVATION_READER.shape, observation.tobytes()
+	elif SCREENSHOT_PATH:
+		f = open(SCREENSHOT_PATH, "rb")
+		observation = f.read()
+		f.close()
+		return OBSERVATION_PNG, (0, 0, 0), observation
+	return OBSERVATION_NONE, (0, 0, 0), b""
+
+
+# sends the parameters and the observation to the server and waits for the action
+# returns the action, wether the agent requested a new level (boolean) and the action counter
+def step(params):
+	global RELOAD, ACTION_COUNT
+	if CONNECTION is None:
+		connect()
+	CONNECTION.submit(params, WORLD_COUNT, *getObservation())
+	action, RELOAD, ACTION_COUNT = CONNECTION.collect()
+	return action, RELOAD, ACTION_COUNT
+
+
+# stores the parameters for the next getAction() call
+def setParams(params):
+	global PARAMS
+	PARAMS = params
+	return params
+
+
+# gets the action for the parameters given to setParams()
+def getAction():
+	return step(PARAMS)[0]
+
+
+# sets the screenshot file, which is sent to the server if there is no observation channel
+def setScreenshotPath(path):
+	global SCREENSHOT_PATH
+	SCREENSHOT_PATH = path
+	return path # for debugging
+
+
+# sets the observation channel (see observationChannel.py), its newest frame is sent to the server
+def setObservationChannelPath(path):
+	global OBSERVATION_CHANNEL_PATH
+	OBSERVATION_CHANNEL_PATH = path
+	return path # for debugging
+
+
+# returns wether the agent requested a new level with the last action (boolean)
+def getReload():
+	return RELOAD
+
+
+# returns the action counter
+def getActionCount():
+	return ACTION_COUNT
+
+
+# returns world count
+def getWorldCount():
+	return WORLD_COUNT
+
+
+# increases world count by given amount
+def increaseWorldCount(amount=1):
+	global WORLD_COUNT
+	WORLD_COUNT = WORLD_COUNT + amount
+	return WORLD_COUNT
+
+
+# cleanup at program end (close the connection)
+def cleanup():
+	global CONNECTION, OBSERVATION_READER
+	if CONNECTION is not None:
+		CONNECTION.close()
+		CONNECTION = None
+	if OBSERVATION_READER is not None:
+		OBSERVATION_READER.close()
+		OBSERVATION_READER = None
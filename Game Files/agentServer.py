@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import json
+import random
+import socket
+import struct
+import selectors
+
+
+'''
+Agent server: one agent (e.g. one network with one replay memory) plays many games at once. The games connect through a unix domain socket
+(see agentClient.py, which has the interface of AIConnector.py) and send their parameters and observations every frame.
+The server collects the requests of all games into a batch, lets the agent choose all actions at once and sends them back.
+A batch is complete when every connected game is waiting, when it has maxBatch requests or when the oldest request waited maxWait seconds.
+
+Protocol (all numbers little endian), every message is its length (uint32) followed by the body:
+	request (game -> server): length of the parameters (uint32), world count (uint32), observation format (uint8, see OBSERVATION_*),
+		observation shape: height, width, channels (uint16 each), parameters (json, utf-8), observation (rest of the message)
+	reply (server -> game): action (uint8), reload (uint8, 1 = the agent wants a new level), action counter of the game (uint32)
+'''
+LENGTH_FORMAT = "<I"
+LENGTH_SIZE = struct.calcsize(LENGTH_FORMAT)
+REQUEST_FORMAT = "<IIBHHH"
+REQUEST_SIZE = struct.calcsize(REQUEST_FORMAT)
+REPLY_FORMAT = "<BBI"
+REPLY_SIZE = struct.calcsize(REPLY_FORMAT)
+
+# formats of the observations
+OBSERVATION_NONE = 0 # no observation
+OBSERVATION_RAW = 1 # uint8 pixels (height, width, channels), row-wise, channels last (as in observationChannel.py)
+OBSERVATION_PNG = 2 # content of a png file (the screenshot)
+OBSERVATION_SYMBOLIC = 3 # int8 block ids (channels, height, width) as in symbolicObservation.py
+
+
+# one request of a game
+# the agent can set reload to True to give the game a new level
+class Request:
+
+	def __init__(self, client, params, worldCount, observationFormat, shape, observation):
+		self.client = client
+		self.params = params
+		self.worldCount = worldCount
+		self.observationFormat = observationFormat
+		self.shape = shape
+		self.observation = observation
+		self.reload = False
+
+	# returns the observation as array (requires numpy), None if it is a png file or missing
+	# raw pixels: uint8 (height, width, channels), symbolic: int8 (channels, height, width)
+	def getFrame(self):
+		import numpy as np
+		if self.observationFormat == OBSERVATION_RAW:
+			return np.frombuffer(self.observation, dtype=np.uint8).reshape(self.shape)
+		if self.observationFormat == OBSERVATION_SYMBOLIC:
+			return np.frombuffer(self.observation, dtype=np.int8).reshape(self.shape[2], self.shape[0], self.shape[1])
+		return None
+
+
+# returns the body of a request message
+def packRequest(params, worldCount, observationFormat=OBSERVATION_NONE, shape=(0, 0, 0), observation=b""):
+	params = json.dumps(params).encode("utf-8")
+	return struct.pack(REQUEST_FORMAT, len(params), worldCount, observationFormat, shape[0], shape[1], shape[2]) + params + observation
+
+
+# returns the Request of the given client from the body of a request message
+def unpackRequest(client, body):
+	paramsLength, worldCount, observationFormat, height, width, channels = struct.unpack_from(REQUEST_FORMAT, body)
+	params = json.loads(body[REQUEST_SIZE:REQUEST_SIZE + paramsLength].decode("utf-8"))
+	return Request(client, params, worldCount, observationFormat, (height, width, channels), body[REQUEST_SIZE + paramsLength:])
+
+
+# returns the given body with its length in front of it
+def frame(body):
+	return struct.pack(LENGTH_FORMAT, len(body)) + body
+
+
+# a connected game
+class Client:
+
+	def __init__(self, sock):
+		self.socket = sock
+		self.buffer = bytearray()
+		self.actionCount = 0
+
+
+# chooses random actions, for testing
+class RandomAgent:
+
+	def __init__(self, seed=None):
+		self.random = random.Random(seed)
+
+	# returns the actions for a list of requests
+	def act(self, requests):
+		return [self.random.randint(0, 3) for r in requests]
+
+
+'''
+The agent is any object with a method act(requests), which gets a list of Request objects (at most one per game) and returns their actions.
+Usage:
+	server = AgentServer("/tmp/agentServer.sock", agent)
+	server.serve()
+'''
+class AgentServer:
+
+	def __init__(self, path, agent, maxBatch=64, maxWait=0.005):
+		self.path = path
+		self.agent = agent
+		self.maxBatch = maxBatch
+		self.maxWait = maxWait
+		self.selector = selectors.DefaultSelector()
+		self.clients = dict() # socket -> Client
+		self.pending = list() # requests waiting for the next batch
+		self.firstPending = None # time of the oldest pending request
+		self.running = False
+		# statistics
+		self.batches = 0
+		self.requests = 0
+		if os.path.exists(path):
+			os.unlink(path)
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.bind(path)
+		self.socket.listen(64)
+		self.socket.setblocking(False)
+		self.selector.register(self.socket, selectors.EVENT_READ)
+
+	# serves the games until stop() is called (or for the given number of seconds)
+	def serve(self, duration=None):
+		self.running = True
+		end = time.time() + duration if duration is not None else None
+		while self.running and ((end is None) or (time.time() < end)):
+			timeout = 0.1
+			if self.pending:
+				timeout = max(0, self.firstPending + self.maxWait - time.time())
+			for key, _ in self.selector.select(timeout):
+				if key.fileobj is self.socket:
+					self.accept()
+				else:
+					self.receive(self.clients[key.fileobj])
+			if self.pending and ((len(self.pending) >= min(self.maxBatch, len(self.clients))) or (time.time() - self.firstPending >= self.maxWait)):
+				self.processBatch()
+
+	def stop(self):
+		self.running = False
+
+	def accept(self):
+		sock, _ = self.socket.accept()
+		sock.setblocking(False)
+		self.clients[sock] = Client(sock)
+		self.selector.register(sock, selectors.EVENT_READ)
+
+	def disconnect(self, client):
+		self.selector.unregister(client.socket)
+		client.socket.close()
+		del self.clients[client.socket]
+		self.pending = [r for r in self.pending if r.client is not client]
+
+	# reads the available data of a client and adds its complete requests to the batch
+	def receive(self, client):
+		try:
+			data = client.socket.recv(1 << 20)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			data = b""
+		if not data: # game has ended
+			self.disconnect(client)
+			return
+		client.buffer.extend(data)
+		while len(client.buffer) >= LENGTH_SIZE:
+			length = struct.unpack_from(LENGTH_FORMAT, client.buffer)[0]
+			if len(client.buffer) < LENGTH_SIZE + length:
+				break
+			body = bytes(client.buffer[LENGTH_SIZE:LENGTH_SIZE + length])
+			del client.buffer[:LENGTH_SIZE + length]
+			if not self.pending:
+				self.firstPending = time.time()
+			self.pending.append(unpackRequest(client, body))
+
+	# lets the agent choose the actions of the pending requests and sends them
+	def processBatch(self):
+		batch, self.pending = self.pending[:self.maxBatch], self.pending[self.maxBatch:]
+		self.firstPending = time.time() if self.pending else None
+		actions = self.agent.act(batch)
+		for request, action in zip(batch, actions):
+			client = request.client
+			client.actionCount += 1
+			try:
+				client.socket.sendall(frame(struct.pack(REPLY_FORMAT, action, 1 if request.reload else 0, client.actionCount)))
+			except OSError:
+				self.disconnect(client)
+		self.batches += 1
+		self.requests += len(batch)
+
+	# returns the average number of requests per batch
+	def getAverageBatchSize(self):
+		return self.requests / float(max(1, self.batches))
+
+	def close(self):
+		for client in list(self.clients.values()):
+			self.disconnect(client)
+		self.selector.unregister(self.socket)
+		self.socket.close()
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+
+
+# main
+# serves games with an agent backend (see agents.py, default: the random agent), prints statistics every 10 seconds
+# arguments: socket path, optional: maximum batch size, name of the agent, options of the agent (name=value)
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python agentServer.py <socket path> [<max batch> [<agent> [<option>=<value> ...]]]")
+		sys.exit(1)
+	from agents import createAgent, parseOptions
+	agent = createAgent(sys.argv[3] if len(sys.argv) > 3 else "random", **parseOptions(sys.argv[4:]))
+	server = AgentServer(sys.argv[1], agent, int(sys.argv[2]) if len(sys.argv) > 2 else 64)
+	print("Serving on {}".format(sys.argv[1]))
+	try:
+		while True:
+			server.serve(10)
+			print("{} games, {} requests, {:.1f} requests per batch".format(len(server.clients), server.requests, server.getAverageBatchSize()))
+	except KeyboardInterrupt:
+		pass
+	server.close()
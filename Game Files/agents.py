@@ -0,0 +1,214 @@
+import sys
+import time
+
+import numpy as np
+
+from utils import convertToNumberIfPossible
+from batchSimulation import BatchSimulation, BLOCK_OUTSIDE, BLOCK_NAMES
+from symbolicObservation import DEFAULT_WINDOW, CHANNEL_BLOCKS, CHANNEL_COUNT, createObservationArray
+from agentServer import RandomAgent, OBSERVATION_RAW, OBSERVATION_PNG, OBSERVATION_SYMBOLIC
+
+
+'''
+Registry of the agent backends an agent server can run (see agentServer.py), selected by name, e.g. on the command line of agentServer.py:
+	python agentServer.py /tmp/agentServer.sock 64 linear epsilon=0.05
+An agent backend is any class (or function) that creates an object with a method act(requests), see agentServer.AgentServer.
+Its options are given as keyword arguments. New backends are added with registerAgent().
+'''
+AGENTS = dict() # name -> factory
+
+
+# adds an agent backend to the registry, returns the factory
+def registerAgent(name, factory):
+	AGENTS[name] = factory
+	return factory
+
+
+# creates the agent backend with the given name and options
+def createAgent(name, **options):
+	if name not in AGENTS:
+		raise ValueError("Unknown agent {} (known agents: {})!".format(name, ", ".join(sorted(AGENTS))))
+	return AGENTS[name](**options)
+
+
+# returns the options from "name=value" strings (e.g. the command line), values are converted to numbers if possible
+def parseOptions(arguments):
+	options = dict()
+	for argument in arguments:
+		name, _, value = argument.partition("=")
+		options[name] = convertToNumberIfPossible(value)
+	return options
+
+
+# number of actions (see simulation.ACTION_*)
+ACTION_COUNT = 4
+# number of different values in the block channel of a symbolic observation (BLOCK_OUTSIDE up to the last block id)
+BLOCK_VALUE_COUNT = len(BLOCK_NAMES) - BLOCK_OUTSIDE
+
+
+'''
+Linear policy over symbolic observations (see symbolicObservation.py), only needs numpy.
+Every cell of the window is one-hot encoded by its block id, the Q-values of all games are computed with a single matrix multiply
+(features (N, cells * BLOCK_VALUE_COUNT + 1) times weights (cells * BLOCK_VALUE_COUNT + 1, ACTION_COUNT)) and the best action is taken,
+or a random one with probability epsilon. update() does one step of linear Q-learning towards given targets.
+So it is a CPU-only baseline and fast enough to test the throughput of the game side.
+The weights are random (seeded) or loaded from a file written by save().
+'''
+class LinearPolicy:
+
+	def __init__(self, window=DEFAULT_WINDOW, weights=None, epsilon=0.0, seed=None):
+		self.random = np.random.RandomState(seed)
+		self.epsilon = epsilon
+		if weights:
+			data = np.load(weights)
+			self.window = tuple(int(v) for v in data["window"])
+			self.weights = data["weights"].astype(np.float32)
+		else:
+			self.window = tuple(window)
+			self.weights = self.random.normal(0.0, 0.01, (self.window[0] * self.window[1] * BLOCK_VALUE_COUNT + 1, ACTION_COUNT)).astype(np.float32)
+		self.cells = self.window[0] * self.window[1]
+		self.offsets = np.arange(self.cells) * BLOCK_VALUE_COUNT # first feature of each cell
+		self.features = None # reused between calls
+
+	# returns the one-hot features of symbolic observations (N, CHANNEL_COUNT, window height, window width) as float32 array
+	# the returned array is reused by the next call
+	def getFeatures(self, observations):
+		count = len(observations)
+		if (self.features is None) or (len(self.features) != count):
+			self.features = np.zeros((count, self.weights.shape[0]), dtype=np.float32)
+		else:
+			self.features.fill(0)
+		blocks = observations[:, CHANNEL_BLOCKS].reshape(count, self.cells).astype(np.intp) - BLOCK_OUTSIDE
+		self.features[np.arange(count)[:, None], self.offsets + blocks] = 1
+		self.features[:, -1] = 1 # bias
+		return self.features
+
+	# returns the Q-values of symbolic observations as float32 array (N, ACTION_COUNT)
+	def getQValues(self, observations):
+		return self.getFeatures(observations).dot(self.weights)
+
+	# returns the actions for symbolic observations (N, CHANNEL_COUNT, window height, window width), e.g. of batchSimulation.BatchSimulation
+	def actBatch(self, observations):
+		actions = self.getQValues(observations).argmax(axis=1)
+		if self.epsilon > 0:
+			explore = self.random.random_sample(len(actions)) < self.epsilon
+			actions[explore] = self.random.randint(0, ACTION_COUNT, np.count_nonzero(explore))
+		return actions
+
+	# returns the actions for a list of agentServer.Request objects with symbolic observations of the policy's window
+	def act(self, requests):
+		shape = (CHANNEL_COUNT, self.window[1], self.window[0])
+		observations = createObservationArray(len(requests), self.window)
+		for i, request in enumerate(requests):
+			frame = request.getFrame() if request.observationFormat == OBSERVATION_SYMBOLIC else None
+			if (frame is None) or (frame.shape != shape):
+				raise ValueError("The linear policy needs symbolic observations of shape {}!".format(shape))
+			observations[i] = frame
+		return self.actBatch(observations).tolist()
+
+	# moves the Q-values of the taken actions towards the targets (one step of gradient descent on the squared error)
+	# the step is divided by the number of active features, so learningRate is the share of the error corrected for a single observation
+	# returns the mean squared error before the step
+	def update(self, observations, actions, targets, learningRate=0.01):
+		features = self.getFeatures(observations)
+		errors = np.asarray(targets, dtype=np.float32) - features.dot(self.weights)[np.arange(len(actions)), actions]
+		gradient = np.zeros((len(actions), ACTION_COUNT), dtype=np.float32)
+		gradient[np.arange(len(actions)), actions] = errors
+		self.weights += learningRate / (len(actions) * (self.cells + 1)) * features.T.dot(gradient)
+		return float(np.mean(errors ** 2))
+
+	def save(self, path):
+		np.savez(path, weights=self.weights, window=np.array(self.window))
+
+
+# one game played by a ConnectorAgent, with its own connector (AIConnector module)
+class ConnectorGame:
+
+	# observationPath: path (without extension) of the screenshot file and the observation channel of the game
+	def __init__(self, connector, observationPath):
+		self.connector = connector
+		self.screenshotPath = observationPath + ".png"
+		self.channelPath = observationPath + ".channel"
+		self.channel = None # observation channel for raw pixels, created with the first raw observation
+		self.connector.setScreenshotPath(self.screenshotPath)
+
+	# hands the observation of the request to the connector and returns the action
+	def act(self, request):
+		if request.observationFormat == OBSERVATION_PNG:
+			f = open(self.screenshotPath, "wb")
+			f.write(request.observation)
+			f.close()
+		elif request.observationFormat == OBSERVATION_RAW:
+			if (self.channel is None) or (self.channel.shape != tuple(request.shape)):
+				from observationChannel import ObservationWriter
+				if self.channel is not None:
+					self.channel.close()
+				self.channel = ObservationWriter(self.channelPath, request.shape)
+				self.connector.setObservationChannelPath(self.channelPath)
+			self.channel.write(request.observation)
+		if request.worldCount > self.connector.getWorldCount():
+			self.connector.increaseWorldCount(request.worldCount - self.connector.getWorldCount())
+		action, request.reload, _ = self.connector.step(request.params)
+		return action
+
+
+'''
+Runs agents with the interface of AIConnector.py (e.g. the Lua DQN or the random agent from "Experiment Files/random") in an agent server.
+These agents keep state between the frames of a game (screen history, transitions, world count), so every game gets its own instance
+of the connector module, loaded from path when the game sends its first request. At most maxGames games are served, a request of another game
+raises an error. The Lua DQN keeps its network and replay memory in files of the working directory, so it can only serve one game (the default).
+The observation of a request is handed over the way the connector reads it: png files are written to the game's screenshot file,
+raw pixels to the game's observation channel (see observationChannel.py), both at observationPath<game number>.
+'''
+class ConnectorAgent:
+
+	def __init__(self, path="AIConnector.py", maxGames=1, observationPath="/tmp/agentServerObservation"):
+		self.path = path
+		self.maxGames = maxGames
+		self.observationPath = observationPath
+		self.games = dict() # agentServer.Client -> ConnectorGame
+
+	# returns the ConnectorGame of the given client
+	def getGame(self, client):
+		game = self.games.get(client)
+		if game is None:
+			if len(self.games) >= self.maxGames:
+				raise ValueError("The connector agent {} can only serve {} games!".format(self.path, self.maxGames))
+			from rolloutRunner import loadConnector
+			game = ConnectorGame(loadConnector(self.path), "{}{}".format(self.observationPath, len(self.games)))
+			self.games[client] = game
+		return game
+
+	def act(self, requests):
+		return [self.getGame(request.client).act(request) for request in requests]
+
+
+registerAgent("random", RandomAgent)
+registerAgent("linear", LinearPolicy)
+registerAgent("connector", ConnectorAgent)
+
+
+# main
+# measures the throughput of the linear policy playing headless games (see batchSimulation.py)
+# arguments (all optional): number of games, number of frames, paths file
+if __name__ == "__main__":
+	from simulation import readPaths
+	games = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+	frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+	levelDir, levelPattern, _, _ = readPaths(sys.argv[3] if len(sys.argv) > 3 else "paths.txt")
+	sim = BatchSimulation(games, levelDir, levelPattern, seed=0)
+	sim.reset()
+	policy = LinearPolicy(epsilon=0.05, seed=0)
+	observations = createObservationArray(games, policy.window)
+	inference = 0.0
+	start = time.time()
+	for _ in range(frames):
+		sim.getSymbolicObservation(policy.window, observations)
+		before = time.time()
+		actions = policy.actBatch(observations)
+		inference += time.time() - before
+		sim.step(actions)
+		if sim.done.any():
+			sim.reset(np.flatnonzero(sim.done))
+	duration = time.time() - start
+	print("{} games, {} frames in {:.2f}s ({:.0f} steps per second, {:.1f}% of the time in the policy)".format(games, frames, duration, games * frames / duration, inference / duration * 100))
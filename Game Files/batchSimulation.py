@@ -0,0 +1,213 @@
+import random
+
+import numpy as np
+
+from levelCache import loadLevel
+from utils import convertToNumberIfPossible
+from simulation import chooseWorld, createSeed, setDefaultVariables, ACTION_LEFT, ACTION_RIGHT, ACTION_JUMP
+from simulation import FLAG_ON_GROUND, FLAG_NOT_MOVED, FLAG_HIT_ENEMY, FLAG_HIT_COIN, FLAG_HIT_GOAL, FLAG_FALL
+
+
+# block ids used inside the batch (levels are translated to these when loaded)
+BLOCK_OUTSIDE = -2 # sentinel for positions outside of the world
+BLOCK_UNKNOWN = -3 # only used while translating a level
+BLOCK_AIR = 0
+BLOCK_GROUND = 1
+BLOCK_ENEMY = 2
+BLOCK_COIN = 3
+BLOCK_SPAWN = 4
+BLOCK_GOAL = 5
+BLOCK_NAMES = ['AIR', 'GROUND', 'ENEMY', 'COIN', 'SPAWN', 'GOAL']
+
+
+# loads a level (through levelCache, so every level file is only read once) and translates it into the block ids of the batch
+# returns the variables, the world as int8 array, the spawn and the goal position
+def loadLevelArray(path):
+	level = loadLevel(path)
+	variables = setDefaultVariables({k: convertToNumberIfPossible(v) for k, v in level.info.items()})
+	grid = level.grid
+	cells = np.frombuffer(grid.pristine, dtype=np.uint8).reshape(grid.height + 2, grid.stride)[1:-1, 1:-1] # without the border
+	lookup = np.full(256, BLOCK_UNKNOWN, dtype=np.int8) # level block id (as uint8) -> batch block id
+	lookup[BLOCK_OUTSIDE & 0xFF] = BLOCK_OUTSIDE # fills up rows shorter than the longest one
+	for i, name in enumerate(BLOCK_NAMES):
+		if name in level.blocks:
+			lookup[level.blocks[name] & 0xFF] = i
+	world = lookup[cells]
+	if (world == BLOCK_UNKNOWN).any():
+		raise ValueError("{} contains blocks unknown to the batch simulation!".format(path))
+	return variables, world, level.spawnpos, level.goalpos
+
+
+'''
+Runs N independent games at once, each one on its own level.
+All player states are kept in arrays and advanced together by step(), which applies the same rules as simulation.Simulation.tick() to every game.
+The worlds are stored in one int8 array of shape (N, height + 2, width + 2), padded with BLOCK_OUTSIDE,
+so lookups don't need any bounds checks. Coordinates are given without that border.
+Games that reached the goal are marked in 'done' and can be reset with reset(indices).
+The block ids around the players can be cut out with getSymbolicObservation() (see symbolicObservation.py).
+'''
+class BatchSimulation:
+
+	def __init__(self, count, levelDir=None, levelPattern=None, seed=None):
+		self.count = count
+		self.levelDir = levelDir
+		self.levelPattern = levelPattern
+		self.seed = seed if seed is not None else createSeed()
+		self.random = random.Random(self.seed) # for choosing levels
+		self.worldnames = [None] * count
+		self.grid = np.full((count, 3, 3), BLOCK_OUTSIDE, dtype=np.int8) # current worlds (coins get removed)
+		self.pristine = self.grid.copy() # worlds as loaded
+		self.sizes = np.zeros((count, 2), dtype=np.int32) # width, height of each world
+		# level variables
+		self.jump = np.zeros(count, dtype=np.int32)
+		self.jumpHeight = np.zeros(count, dtype=np.int32)
+		self.jumpWidth = np.zeros(count, dtype=np.int32)
+		self.coinWorth = np.zeros(count, dtype=np.int32)
+		self.deathWorth = np.zeros(count, dtype=np.int32)
+		self.goalWorth = np.zeros(count, dtype=np.int32)
+		self.startingScore = np.zeros(count, dtype=np.int32)
+		self.spawnpos = np.zeros((count, 2), dtype=np.int32)
+		self.goalpos = np.zeros((count, 2), dtype=np.int32)
+		# player state
+		self.x = np.zeros(count, dtype=np.int32)
+		self.y = np.zeros(count, dtype=np.int32)
+		self.jumping = np.zeros(count, dtype=np.int32)
+		self.jumpingPhase = np.zeros(count, dtype=np.int32)
+		self.score = np.zeros(count, dtype=np.int32)
+		self.done = np.zeros(count, dtype=bool)
+		# statistics (reset with the level)
+		self.deathCount = np.zeros(count, dtype=np.int32)
+		self.levelCount = np.zeros(count, dtype=np.int32)
+		self.coinCount = np.zeros(count, dtype=np.int32)
+		self.movesCount = np.zeros((count, 4), dtype=np.int32)
+		self.frameCounter = 0
+		self.index = np.arange(count)
+
+	# makes sure the world array can hold a world of the given size
+	def ensureGridSize(self, width, height):
+		_, h, w = self.grid.shape
+		if (height + 2 <= h) and (width + 2 <= w):
+			return
+		shape = (self.count, max(h, height + 2), max(w, width + 2))
+		for name in ('grid', 'pristine'):
+			old = getattr(self, name)
+			new = np.full(shape, BLOCK_OUTSIDE, dtype=np.int8)
+			new[:, :h, :w] = old
+			setattr(self, name, new)
+
+	# loads new levels into the games with the given indices (default: all games)
+	# levels is a list with one level path per index, random levels from levelDir are chosen if it is None
+	# returns the observation of all games
+	def reset(self, indices=None, levels=None):
+		if indices is None:
+			indices = range(self.count)
+		for i, idx in enumerate(indices):
+			level = levels[i] if levels is not None else chooseWorld(self.levelDir, self.levelPattern, self.random)
+			variables, world, spawnpos, goalpos = loadLevelArray(level)
+			height, width = world.shape
+			self.ensureGridSize(width, height)
+			self.pristine[idx] = BLOCK_OUTSIDE
+			self.pristine[idx, 1:height + 1, 1:width + 1] = world
+			self.grid[idx] = self.pristine[idx]
+			self.sizes[idx] = (width, height)
+			self.worldnames[idx] = level
+			self.jump[idx] = variables['jump']
+			self.jumpHeight[idx] = variables['jump_height']
+			self.jumpWidth[idx] = variables['jump_width']
+			self.coinWorth[idx] = variables['coin_worth']
+			self.deathWorth[idx] = variables['death_worth']
+			self.goalWorth[idx] = variables['goal_worth']
+			self.startingScore[idx] = variables['starting_score'] if 'starting_score' in variables else 0
+			self.spawnpos[idx] = spawnpos
+			self.goalpos[idx] = goalpos
+		indices = np.asarray(list(indices), dtype=np.intp)
+		self.x[indices] = self.spawnpos[indices, 0]
+		self.y[indices] = self.spawnpos[indices, 1]
+		self.jumping[indices] = 0
+		self.jumpingPhase[indices] = 0
+		self.score[indices] = self.startingScore[indices]
+		self.done[indices] = False
+		self.deathCount[indices] = 0
+		self.levelCount[indices] = 0
+		self.coinCount[indices] = 0
+		self.movesCount[indices] = 0
+		return self.getObservation()
+
+	# advances all games by one frame, actions is an array with one action per game
+	# returns the observation, the movement flags (as bitmasks, see simulation.FLAG_*) and the scores of all games
+	def step(self, actions):
+		actions = np.asarray(actions)
+		idx = self.index
+		self.frameCounter += 1
+		np.add.at(self.movesCount, (idx, actions), 1)
+
+		# apply action
+		move = (actions == ACTION_RIGHT).astype(np.int32) - (actions == ACTION_LEFT)
+		jump = (actions == ACTION_JUMP) & (self.jumping < self.jump)
+		self.jumping += jump
+		phase = np.where(jump, self.jumpHeight, self.jumpingPhase)
+
+		# move player up/down (coordinates inside the grid are shifted by one because of the border)
+		gx = self.x + 1
+		gy = self.y + 1
+		below = self.grid[idx, gy + 1, gx]
+		gravity = phase == 0
+		fall = gravity & (below == BLOCK_OUTSIDE)
+		gy += gravity & ~fall & (below != BLOCK_GROUND)
+		above = self.grid[idx, gy - 1, gx]
+		gy -= (phase > 0) & (above != BLOCK_OUTSIDE) & (above != BLOCK_GROUND)
+
+		# move player left/right
+		side = self.grid[idx, gy, gx + move]
+		notMoved = ~fall & ((side == BLOCK_OUTSIDE) | (side == BLOCK_GROUND))
+		gx += move * (~fall & ~notMoved)
+
+		# check current block / fill flags
+		onGround = ~fall & (self.grid[idx, gy + 1, gx] == BLOCK_GROUND)
+		block = self.grid[idx, gy, gx]
+		hitEnemy = ~fall & (block == BLOCK_ENEMY)
+		hitCoin = ~fall & (block == BLOCK_COIN)
+		hitGoal = ~fall & (block == BLOCK_GOAL)
+		flags = (FLAG_ON_GROUND * onGround + FLAG_NOT_MOVED * notMoved + FLAG_HIT_ENEMY * hitEnemy
+			+ FLAG_HIT_COIN * hitCoin + FLAG_HIT_GOAL * hitGoal + FLAG_FALL * fall).astype(np.uint8)
+		self.x = gx - 1
+		self.y = gy - 1
+
+		# update jumping state
+		phase = np.where((phase > 1) | (phase < 0), phase - 1, np.where(phase == 1, -1, phase))
+		phase[phase < -self.jumpWidth] = 0
+
+		# interprete flags
+		dead = fall | hitEnemy
+		self.score = np.where(dead, np.maximum(0, self.score + self.deathWorth), self.score)
+		self.deathCount += dead
+		self.x[dead] = self.spawnpos[dead, 0]
+		self.y[dead] = self.spawnpos[dead, 1]
+		self.grid[idx[hitCoin], gy[hitCoin], gx[hitCoin]] = BLOCK_AIR
+		self.score = np.where(hitCoin, np.maximum(0, self.score + self.coinWorth), self.score)
+		self.coinCount += hitCoin
+		self.score = np.where(hitGoal, np.maximum(0, self.score + self.goalWorth), self.score)
+		self.levelCount += hitGoal
+		self.done |= hitGoal
+		landed = hitGoal | onGround
+		self.jumping[landed] = 0
+		phase[landed] = 0
+		self.jumpingPhase = phase
+
+		return self.getObservation(), flags, self.score
+
+	# returns the current observation of all games (same keys as the parameters in simulation.Simulation.getParams)
+	def getObservation(self):
+		return {
+			"score": self.score,
+			"x": self.x,
+			"xDistanceToGoal": self.goalpos[:, 0] - self.x,
+			"deathCount": self.deathCount,
+			"levelBeatenCount": self.levelCount,
+		}
+
+	# returns the block ids in a window of the given size around the players as int8 array (N, channels, height, width)
+	# (see symbolicObservation.extractWindows), written to out if given
+	def getSymbolicObservation(self, window=None, out=None):
+		from symbolicObservation import extractWindows, DEFAULT_WINDOW
+		return extractWindows(self.grid, self.x, self.y, window or DEFAULT_WINDOW, out)
@@ -62,6 +62,10 @@ print(string.format("FPS: %d, Reacting every %d frames", FPS, REACT_EVERY_NTH_FR
 -- ideally on a ramdisk (for speed and less stress on the hard drive)
 SCREENSHOT_FILEPATH = "/media/ramdisk/tmp/current.png"
 
+-- path of the observation channel (shared memory file with raw screens, see observationChannel.py)
+-- will be set by the python game if it uses an observation channel, SCREENSHOT_FILEPATH is not used then
+OBSERVATION_CHANNEL_PATH = nil
+
 IMG_DIMENSIONS = {1, 64, 64} -- screenshots will be resized to this immediately
 IMG_DIMENSIONS_Q_HISTORY = {1, 32, 32} -- size of images fed into Q (action history)
 IMG_DIMENSIONS_Q_LAST = {1, 64, 64} -- size of the last state's image fed into Q
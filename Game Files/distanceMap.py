@@ -0,0 +1,334 @@
+import os
+import sys
+import zlib
+import struct
+from array import array
+from collections import deque
+
+from worldSaver import getCachePath, getLevelFile
+from levelCache import loadLevel
+from utils import convertToNumberIfPossible
+from simulation import computeTransition, setDefaultVariables, ACTION_NO_ACTION, ACTION_JUMP, FLAG_HIT_GOAL
+
+
+# distance of states from which the goal can't be reached
+UNREACHABLE = -1
+
+'''
+Cached distance maps are stored as <level directory>/__levelcache__/<level file name>.dist (levels in level packs: see DistanceMapPack)
+File layout (all numbers little endian):
+	header: magic (4 bytes), version (uint16), modification time (nanoseconds) and size of the level file (uint64 each),
+		width, height, jump_height, jump_width, jump, spawn x, spawn y (uint16 each)
+	distances: one int16 per state (see DistanceMap.index), compressed with zlib
+The cached map is only used if modification time and size of the level file haven't changed.
+'''
+MAGIC = b"DIST"
+VERSION = 1
+HEADER_FORMAT = "<4sHQQHHHHHHH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAX_DISTANCE = 32767
+EXTENSION = ".dist"
+
+
+'''
+Distances to the goal for all player states of a level, in ticks (1 = the goal can be reached with the next action).
+The distances are computed with the exact rules of the game (see simulation.computeTransition), so jumps, enemies and
+necessary detours are taken into account. A player state is (x, y, jumpingPhase, jumping), all states are stored in one array,
+UNREACHABLE for states from which the goal can't be reached (or which can't be reached from the spawn position at all).
+'''
+class DistanceMap:
+
+	def __init__(self, width, height, jumpHeight, jumpWidth, jump, spawnpos, distances=None):
+		self.width = width
+		self.height = height
+		self.jumpHeight = jumpHeight
+		self.jumpWidth = jumpWidth
+		self.jump = jump
+		self.spawnpos = tuple(spawnpos)
+		self.phases = jumpHeight + jumpWidth + 1 # jumpingPhase is between -jumpWidth and jumpHeight
+		self.jumps = jump + 1 # jumping is between 0 and jump
+		size = width * height * self.phases * self.jumps
+		self.distances = distances if distances is not None else array('h', [UNREACHABLE]) * size
+
+	# returns the index of the given state in distances
+	def index(self, x, y, jumpingPhase, jumping):
+		return ((y * self.width + x) * self.phases + jumpingPhase + self.jumpWidth) * self.jumps + jumping
+
+	# returns the distance to the goal from the given state
+	def get(self, x, y, jumpingPhase, jumping):
+		return self.distances[((y * self.width + x) * self.phases + jumpingPhase + self.jumpWidth) * self.jumps + jumping]
+
+	# returns the shortest distance to the goal from the given position (any jumping state)
+	def getCell(self, x, y):
+		start = self.index(x, y, -self.jumpWidth, 0)
+		distances = [d for d in self.distances[start:start + self.phases * self.jumps] if d != UNREACHABLE]
+		return min(distances) if distances else UNREACHABLE
+
+	# returns the distance to the goal from the spawn position
+	def getSpawnDistance(self):
+		return self.get(self.spawnpos[0], self.spawnpos[1], 0, 0)
+
+	# returns wether the goal can be reached from the spawn position
+	def isReachable(self):
+		return self.getSpawnDistance() != UNREACHABLE
+
+
+# computes the distance map of a level
+# world: worldGrid.WorldGrid (its pristine blocks are used), blocks: block name -> id mapping, variables: level variables
+def computeDistanceMap(world, blocks, variables):
+	distanceMap = DistanceMap(world.width, world.height, variables['jump_height'], variables['jump_width'], variables['jump'], world.spawnpos)
+	cells, world.cells = world.cells, array('b', world.pristine) # compute with all coins in place
+	try:
+		# find all states reachable from the spawn position and their predecessors
+		states = [(world.spawnpos[0], world.spawnpos[1], 0, 0)]
+		index = {states[0]: 0}
+		predecessors = [list()]
+		goalStates = list() # states from which the goal is reached with one action
+		queue = deque([0])
+		while queue:
+			s = queue.popleft()
+			for action in range(ACTION_NO_ACTION, ACTION_JUMP + 1):
+				state, bits, _ = computeTransition(world, blocks, variables, world.spawnpos, states[s], action)
+				if bits & FLAG_HIT_GOAL:
+					goalStates.append(s)
+					continue
+				if state not in index:
+					index[state] = len(states)
+					states.append(state)
+					predecessors.append(list())
+					queue.append(index[state])
+				predecessors[index[state]].append(s)
+	finally:
+		world.cells = cells
+
+	# breadth first search backwards from the goal
+	distances = [UNREACHABLE] * len(states)
+	queue = deque()
+	for s in goalStates:
+		if distances[s] == UNREACHABLE:
+			distances[s] = 1
+			queue.append(s)
+	while queue:
+		s = queue.popleft()
+		for p in predecessors[s]:
+			if distances[p] == UNREACHABLE:
+				distances[p] = min(distances[s] + 1, MAX_DISTANCE)
+				queue.append(p)
+	for state, distance in zip(states, distances):
+		distanceMap.distances[distanceMap.index(*state)] = distance
+	return distanceMap
+
+
+# returns a distance map from its serialized form (as in a .dist file), None if it is outdated or broken
+# (stat: os.stat of the level file or level pack)
+def parseDistanceMap(data, stat):
+	if len(data) < HEADER_SIZE:
+		return None
+	magic, version, mtime, size, width, height, jumpHeight, jumpWidth, jump, spawnX, spawnY = struct.unpack_from(HEADER_FORMAT, data)
+	if (magic != MAGIC) or (version != VERSION) or (mtime != stat.st_mtime_ns) or (size != stat.st_size):
+		return None
+	distanceMap = DistanceMap(width, height, jumpHeight, jumpWidth, jump, (spawnX, spawnY))
+	distances = array('h')
+	try:
+		distances.frombytes(zlib.decompress(data[HEADER_SIZE:]))
+	except zlib.error:
+		return None
+	if len(distances) != len(distanceMap.distances):
+		return None
+	if sys.byteorder != "little":
+		distances.byteswap()
+	distanceMap.distances = distances
+	return distanceMap
+
+
+# returns the serialized form of a distance map (stat: os.stat of the level file or level pack)
+def serializeDistanceMap(distanceMap, stat):
+	distances = array('h', distanceMap.distances)
+	if sys.byteorder != "little":
+		distances.byteswap()
+	return struct.pack(HEADER_FORMAT, MAGIC, VERSION, stat.st_mtime_ns, stat.st_size, distanceMap.width, distanceMap.height,
+		distanceMap.jumpHeight, distanceMap.jumpWidth, distanceMap.jump, distanceMap.spawnpos[0], distanceMap.spawnpos[1]) + zlib.compress(distances.tobytes())
+
+
+# reads a cached distance map, returns None if it doesn't exist or is outdated (stat: os.stat of the level file)
+def readDistanceMap(path, stat):
+	if not os.path.isfile(path):
+		return None
+	f = open(path, "rb")
+	data = f.read()
+	f.close()
+	return parseDistanceMap(data, stat)
+
+
+# writes a distance map to the cache (stat: os.stat of the level file)
+def writeDistanceMap(path, distanceMap, stat):
+	directory = os.path.dirname(path)
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	tmp = "{}.{}.tmp".format(path, os.getpid())
+	f = open(tmp, "wb")
+	f.write(serializeDistanceMap(distanceMap, stat))
+	f.close()
+	os.replace(tmp, path) # other processes never see a half written file
+
+
+'''
+The distance maps of the levels in a level pack (see levelPack.py) are cached in one file per pack, <level directory>/__levelcache__/<pack file name>.dist,
+instead of one file per level. The maps are appended to the file as they are computed, so several processes can share it.
+File layout (all numbers little endian):
+	header: magic (4 bytes), version (uint16), modification time (nanoseconds) and size of the level pack (uint64 each)
+	records: length of the level name (uint16), length of the map (uint32), level name (utf-8), map (same as a single .dist file)
+The file is started anew when the pack has changed.
+'''
+PACK_MAGIC = b"DPAK"
+PACK_HEADER_FORMAT = "<4sHQQ"
+PACK_HEADER_SIZE = struct.calcsize(PACK_HEADER_FORMAT)
+RECORD_FORMAT = "<HI"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# distance map files of the level packs used by this process (path -> DistanceMapPack), see getDistanceMapPack
+DISTANCE_MAP_PACKS = dict()
+
+
+# index of the distance map file of a level pack
+class DistanceMapPack:
+
+	# stat: os.stat of the level pack
+	def __init__(self, path, stat):
+		self.path = path
+		self.stat = stat
+		self.entries = dict() # level name -> (offset, length) of the map in the file
+		self.indexed = 0 # size of the part of the file that has been indexed
+		self.current = False # wether the file belongs to the current version of the pack
+
+	# indexes the records appended since the last call (also by other processes)
+	def refresh(self):
+		try:
+			size = os.path.getsize(self.path)
+		except OSError:
+			size = 0
+		if size < self.indexed: # started anew by another process
+			self.entries, self.indexed, self.current = dict(), 0, False
+		if size == self.indexed:
+			return
+		f = open(self.path, "rb")
+		try:
+			if self.indexed == 0:
+				header = f.read(PACK_HEADER_SIZE)
+				if len(header) < PACK_HEADER_SIZE:
+					return
+				magic, version, mtime, packSize = struct.unpack(PACK_HEADER_FORMAT, header)
+				self.current = (magic == PACK_MAGIC) and (version == VERSION) and (mtime == self.stat.st_mtime_ns) and (packSize == self.stat.st_size)
+				if not self.current:
+					return
+				self.indexed = PACK_HEADER_SIZE
+			f.seek(self.indexed)
+			data = f.read(size - self.indexed)
+		finally:
+			f.close()
+		position = 0
+		while position + RECORD_SIZE <= len(data):
+			nameLength, length = struct.unpack_from(RECORD_FORMAT, data, position)
+			end = position + RECORD_SIZE + nameLength + length
+			if end > len(data): # still being written
+				break
+			name = data[position + RECORD_SIZE:position + RECORD_SIZE + nameLength].decode("utf-8")
+			self.entries[name] = (self.indexed + position + RECORD_SIZE + nameLength, length)
+			position = end
+		self.indexed = self.indexed + position
+
+	# returns the cached map of the level with the given name, None if it isn't cached
+	def read(self, name):
+		self.refresh()
+		if name not in self.entries:
+			return None
+		offset, length = self.entries[name]
+		f = open(self.path, "rb")
+		f.seek(offset)
+		data = f.read(length)
+		f.close()
+		return parseDistanceMap(data, self.stat)
+
+	# appends the map of the level with the given name
+	def write(self, name, distanceMap):
+		self.refresh()
+		if not self.current: # start the file anew
+			directory = os.path.dirname(self.path)
+			if not os.path.exists(directory):
+				os.makedirs(directory)
+			tmp = "{}.{}.tmp".format(self.path, os.getpid())
+			f = open(tmp, "wb")
+			f.write(struct.pack(PACK_HEADER_FORMAT, PACK_MAGIC, VERSION, self.stat.st_mtime_ns, self.stat.st_size))
+			f.close()
+			os.replace(tmp, self.path)
+			self.entries, self.indexed, self.current = dict(), PACK_HEADER_SIZE, True
+		name = name.encode("utf-8")
+		data = serializeDistanceMap(distanceMap, self.stat)
+		f = open(self.path, "ab")
+		f.write(struct.pack(RECORD_FORMAT, len(name), len(data)) + name + data) # one write, so records of other processes don't get mixed in
+		f.close()
+
+
+# returns the distance map file of the given level pack (stat: os.stat of the pack), opened again if the pack has changed
+def getDistanceMapPack(packPath, stat):
+	pack = DISTANCE_MAP_PACKS.get(packPath)
+	if (pack is None) or (pack.stat.st_mtime_ns != stat.st_mtime_ns) or (pack.stat.st_size != stat.st_size):
+		pack = DistanceMapPack(getCachePath(packPath, EXTENSION), stat)
+		DISTANCE_MAP_PACKS[packPath] = pack
+	return pack
+
+
+# returns the cached distance map of the given level, None if it isn't cached or outdated
+def readCachedDistanceMap(levelPath):
+	levelFile = getLevelFile(levelPath)
+	stat = os.stat(levelFile)
+	if levelFile != levelPath: # level in a level pack
+		return getDistanceMapPack(levelFile, stat).read(os.path.basename(levelPath))
+	return readDistanceMap(getCachePath(levelPath, EXTENSION), stat)
+
+
+# caches the distance map of the given level
+def writeCachedDistanceMap(levelPath, distanceMap):
+	levelFile = getLevelFile(levelPath)
+	stat = os.stat(levelFile)
+	if levelFile != levelPath: # level in a level pack
+		getDistanceMapPack(levelFile, stat).write(os.path.basename(levelPath), distanceMap)
+	else:
+		writeDistanceMap(getCachePath(levelPath, EXTENSION), distanceMap, stat)
+
+
+# returns the distance map of the given level, from the cache if possible (it is computed and cached otherwise)
+# world, blocks and variables are the loaded level
+def loadDistanceMap(levelPath, world, blocks, variables):
+	distanceMap = readCachedDistanceMap(levelPath)
+	if distanceMap is None:
+		distanceMap = computeDistanceMap(world, blocks, variables)
+		try:
+			writeCachedDistanceMap(levelPath, distanceMap)
+		except (IOError, OSError): # e.g. read-only level directory, the map is just computed again next time
+			pass
+	return distanceMap
+
+
+# returns the distance map of the given level, the level is only loaded if the map isn't cached yet (see levelCache.py)
+def loadLevelDistanceMap(levelPath):
+	distanceMap = readCachedDistanceMap(levelPath)
+	if distanceMap is None:
+		level = loadLevel(levelPath)
+		variables = setDefaultVariables({k: convertToNumberIfPossible(v) for k, v in level.info.items()})
+		distanceMap = loadDistanceMap(levelPath, level.createWorld(), level.blocks, variables)
+	return distanceMap
+
+
+# main
+# lists the levels that can't be beaten (arguments: level files)
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python distanceMap.py <level> [<level> ...]")
+		sys.exit(1)
+	unreachable = 0
+	for level in sys.argv[1:]:
+		if not loadLevelDistanceMap(level).isReachable():
+			print("unreachable: {}".format(level))
+			unreachable += 1
+	print("{} of {} levels can't be beaten.".format(unreachable, len(sys.argv) - 1))
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pygame as pg
+
+
+'''
+Ring buffer holding the last frames (screenshots) in memory.
+Frames are numbered, starting at 1 for the first frame added. The newest frame has number frameNumber,
+frames older than frameNumber - count + 1 are overwritten.
+'''
+class FrameHistory:
+
+	# count: how many frames are kept, shape: shape of one frame as (height, width, channels)
+	def __init__(self, count, shape):
+		self.count = count
+		self.shape = tuple(shape)
+		self.frames = np.zeros((count,) + self.shape, dtype=np.uint8)
+		self.frameNumber = 0 # number of the newest frame, 0 = no frame added yet
+
+	# adds a frame (uint8 array of the frame shape or anything supporting the buffer protocol with the same size, e.g. bytes)
+	# returns the number of the frame
+	def add(self, frame):
+		self.frameNumber += 1
+		self.frames[self.frameNumber % self.count] = np.frombuffer(frame, dtype=np.uint8).reshape(self.shape)
+		return self.frameNumber
+
+	# returns the frame with the given number or None if it isn't in the history (anymore)
+	# the returned array is a view and will be overwritten by later frames
+	def get(self, frameNumber):
+		if (frameNumber <= 0) or (frameNumber > self.frameNumber) or (frameNumber <= self.frameNumber - self.count):
+			return None
+		return self.frames[frameNumber % self.count]
+
+	# returns the last frames stacked into one contiguous array of shape (length, height, width, channels), newest frame first
+	# positions before the first frame are filled with zeros
+	# out can be an array of the correct shape to write the stack into
+	def getStack(self, length=None, out=None):
+		length = self.count if length is None else min(length, self.count)
+		indices = (self.frameNumber - np.arange(length)) % self.count
+		stack = np.take(self.frames, indices, axis=0, out=out)
+		if self.frameNumber < length:
+			stack[self.frameNumber:] = 0
+		return stack
+
+	# saves the newest frame to the given directory as <prefix>00<extension> and renames the files of the older frames (01, 02, ...)
+	# (same naming as the older screenshots in game.py), so only one frame is encoded per call
+	def spill(self, directory, prefix="", extension=".png"):
+		for i in range(min(self.count, self.frameNumber) - 1, 0, -1):
+			try:
+				os.replace("{}{}{:02d}{}".format(directory, prefix, i - 1, extension), "{}{}{:02d}{}".format(directory, prefix, i, extension))
+			except FileNotFoundError: # not spilled before
+				pass
+		frame = self.frames[self.frameNumber % self.count]
+		surface = pg.image.frombuffer(frame.repeat(3 // self.shape[2], axis=2).tobytes(), (self.shape[1], self.shape[0]), "RGB") # grayscale frames are saved as RGB
+		pg.image.save(surface, "{}{}00{}".format(directory, prefix, extension))
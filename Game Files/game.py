@@ -1,12 +1,17 @@
 import os
-import random
-from fnmatch import fnmatch
 import time
+import random
 
 import pygame as pg
 from pygame.locals import *
-from worldSaver import loadWorld
 from utils import *
+from tileCache import loadLevelTiles, convertSurface
+from worldGrid import BLOCK_OUTSIDE
+from levelCache import loadLevel, CACHE as LEVEL_CACHE
+from distanceMap import loadDistanceMap
+from levelPrefetcher import prepareLevel
+import simulation
+from simulation import chooseEpisodeWorld, createSeed, ACTION_NO_ACTION, ACTION_LEFT, ACTION_RIGHT, ACTION_JUMP
 
 
 # globals - world (extracted from the world file)
@@ -14,36 +19,51 @@ BLOCKS_NAME_TO_ID = {} # text-id-mapping (!blocks from world file)
 BLOCKS_ID_TO_NAME = {} # inversion: id-text-mapping
 VARIABLES = {} # other variables (!info from world file)
 BLOCKGFX = {} # images for tiles (!blockgfx from world file)
-WORLD = None # the world as lists of lists of block ids (row-wise / y coordinate first) (!world from world file)
+WORLD = None # the world as WorldGrid (see worldGrid.py) (!world from world file)
 GOALPOS = None # Coordinates of the goal (x coordinate first)
 SPAWNPOS = None # spawn position (first player position and respawn position)
+DISTANCE_MAP = None # distances to the goal for all player states (see distanceMap.py), only computed in AI mode
 
 # globals - game
 SCREEN = None # the screen for pygame
 SCREEN_RESOLUTION = (768, 640) # 24x20 blocks (for 32x32 pixel per block)
 SCREEN_SIZE_BLOCKS = None # amount of blocks in X and Y direction (tuple, will be computed when a level is loaded)
+LEVEL_SURFACE = None # the whole level drawn once when it is loaded, the screen shows a part of it
 PLAYERPOS = None # position of the player character
 POSITION_X_HISTORY = list() # a history of the player's x positions of the last POSITION_HISTORY_LENGTH frames
-POSITION_HISTORY_LENGTH = 10 # length of POSITION_X_HISTORY
+POSITION_HISTORY_LENGTH = simulation.POSITION_HISTORY_LENGTH # length of POSITION_X_HISTORY
 SCORE = 0 # the score
 FONT = None # the font object for writing the score
 MODE = 0 # 0 = automatic, 1 = manual
-FPS = 0 if MODE == 0 else 10 # maximum frames per second, 0 to remove limit
+FPS = 0 if MODE == 0 else 10 # maximum frames per second, 0 to remove limit (only used in real time mode)
+CLOCK_MODE = 1 if MODE == 0 else 0 # 0 = real time (FPS limit, freezes wait), 1 = fast forward (no window, no waiting at all), 2 = watch (like fast forward, but the display is updated up to WATCH_FPS times per second)
+WATCH_FPS = 30 # maximum display updates per second in watch mode
+FREEZE_TICKS = 5 # for how many ticks the screen freezes (twice) after a death, a beaten level or a reload
+SIMULATION_TICKS = 0 # simulation clock: number of frames plus freeze ticks
+LAST_DISPLAY_UPDATE = 0 # time of the last display update in watch mode
+SHOW_FRAME = CLOCK_MODE != 1 # wether the current frame is shown on the display (see updateClock)
 FRAME_COUNTER = 0 # counts the number of frames that happened - equivalent to number of actions taken
 NUMBERS = None # holds the number graphics for the score
 MAX_TRAINED_FRAMES = 1000000 # after how many trained frames (AI mode) the game will terminate (0 for never)
+ACTION_REPEAT = 1 # how many ticks each action of the AI is repeated (AI mode), the screen is only drawn and captured on the last one
 WORLDNAME = None # name (actually the path) of the currently loaded world
 WORLDCOUNT = None # how many worlds the network has been trained on (including current world) (only in AI mode)
-
-# globals - constants for action ids
-ACTION_NO_ACTION = 0
-ACTION_LEFT = 1
-ACTION_RIGHT = 2
-ACTION_JUMP = 3
+SEED = None # seed of the run, the levels and the random module (e.g. for the AI) are seeded from it, None = chosen randomly (it is printed)
+RUN_RANDOM = None # random number generator of the run, gives the seeds of the episodes
+EPISODE_SEED = None # seed of the current episode (the level is chosen with it)
+ACTION_LOG_PATH = None # if set, the level, the seed and the actions of every episode are recorded to this file (see actionLog.py)
+ACTION_LOG = None # writer for the action log
+AGENT_SERVER_PATH = None # if set (e.g. r"/tmp/agentServer.sock"), the AI runs in an agent server serving many games (see agentServer.py) instead of in this process
 
 # globals - levels
 LEVEL_PREFIX = None # path to the level directory
 LEVEL_PATTERN = None # pattern for the level (level will be chosen randomly from all matching files)
+LEVEL_PREFETCH_DEPTH = 2 if MODE == 0 else 0 # how many levels are loaded in advance by a background thread (see levelPrefetcher.py), 0 = levels are loaded when needed
+LEVEL_PREFETCHER = None # the background thread loading the levels
+PREPARED_LEVEL = None # the level loaded in advance for the next episode
+LEVEL_CACHE_SIZE = 1024 # how many loaded levels are kept in memory (see levelCache.py), the hit rate is printed at the end
+SKIP_UNREACHABLE_LEVELS = 1 # 1 = levels in which the goal can't be reached are skipped (AI mode), 0 = they are played anyway
+SKIP_ATTEMPTS = 100 # how many levels are tried at most before an unreachable level is played anyway
 
 # globals - statistics (will be reset after a new level is loaded)
 STATISTICS_FILE_NAME = None # where the statistics are stored
@@ -59,26 +79,30 @@ MOVES_COUNT = [0, 0, 0, 0] # counts how often each action is taken
 SCREENSHOT_DIRECTORY = None # where to store the screenshots
 SCREENSHOT_CURRENT_SIZE = (256, 213) # size (in pixels) of current frame screenshot
 SCREENSHOT_OLD_SIZE = (128, 128) # size (in pixels) of older frame screenshots
-SCREENSHOT_OLD_COUNT = 0 # how many older screenshots to save (including the current screenshot) (0 means only current screenshot)
+SCREENSHOT_OLD_COUNT = 0 # how many older screenshots to keep (including the current screenshot) (0 means only current screenshot)
+SCREENSHOT_OLD_TO_DISK = 0 # older screenshots are kept in memory (FRAME_HISTORY), 1 = additionally save them to the screenshot directory every frame
 SCREENSHOT_OLD_PREFIX = "" # prefix for older screenshots, numbers will be appended
 SCREENSHOT_CURRENT_NAME = "current" # name (without extension) for bigger resolution current screenshot
 SCREENSHOT_EXTENSION = ".png" # file extension for screenshots
 SCREENSHOTS_ACTIVE = 1 if MODE == 0 else 0 # 0 = no screenshots, 1 = take screenshots
+OBSERVATION_CHANNEL_PATH = None # if set (e.g. r"/dev/shm/observation"), the current screenshot is handed to the AI as raw pixels via shared memory instead of a png file (see observationChannel.py)
+OBSERVATION_CHANNEL = None # writer for the observation channel
+OBSERVATION_SIZE = None # if set to (width, height, channels), e.g. (64, 64, 1), the screenshot is rendered directly in this size (grayscale for 1 channel) without drawing the full screen (see observationRenderer.py)
+OBSERVATION_RENDERER = None # renderer for OBSERVATION_SIZE, only used in AI mode
+FRAME_HISTORY = None # in-memory history of the older screenshots (see frameHistory.py), only used if SCREENSHOT_OLD_COUNT > 0
+FRAME_HISTORY_CHANNEL_PATH = None # if set (e.g. r"/dev/shm/history"), the stacked older screenshots (newest first) are handed to the AI every frame via this observation channel, frames are (SCREENSHOT_OLD_COUNT * height, width, channels)
+FRAME_HISTORY_CHANNEL = None # writer for the frame history channel
 
 
 # reads information about which levels to use and where to put the statistics and the screenshots from the given file.
 def loadPaths(path):
 	global LEVEL_PREFIX, LEVEL_PATTERN, STATISTICS_FILE_NAME, SCREENSHOT_DIRECTORY
 	print("Loading paths ...")
-	pf = open(path, 'r')
-	paths = [line[:-1] for line in pf]
-	LEVEL_PREFIX = paths[0] # default: r"levels/"
+	# defaults: r"levels/", r"training_*.txt", r"learned/statistics_test.csv", r"/media/ramdisk/tmp/"
+	LEVEL_PREFIX, LEVEL_PATTERN, STATISTICS_FILE_NAME, SCREENSHOT_DIRECTORY = simulation.readPaths(path)
 	print("LEVEL_PREFIX", LEVEL_PREFIX)
-	LEVEL_PATTERN = paths[1] # default: r"training_*.txt"
 	print("LEVEL_PATTERN", LEVEL_PATTERN)
-	STATISTICS_FILE_NAME = paths[2] # default: r"learned/statistics_test.csv"
 	print("STATISTICS_FILE_NAME", STATISTICS_FILE_NAME)
-	SCREENSHOT_DIRECTORY = paths[3] # default: r"/media/ramdisk/tmp/"
 	print("SCREENSHOT_DIRECTORY", SCREENSHOT_DIRECTORY)
 	# create subfolder, if it doesn't exist
 	if not os.path.exists(SCREENSHOT_DIRECTORY):
@@ -88,12 +112,9 @@ def loadPaths(path):
 
 
 # loads tiles as specified in the given dict. defaults to "gfx/<BLOCKNAME>/primitive.png if not specified
+# (see tileCache.py)
 def loadTileGraphics(blockgfx):
-	global BLOCKGFX
-	for k, v in BLOCKS_NAME_TO_ID.items():
-		gfxpath = blockgfx[v] if v in blockgfx else r"gfx/{}/primitive.png".format(k.lower())
-		BLOCKGFX[v] = pg.image.load(gfxpath)
-	BLOCKGFX[-1] = pg.image.load(blockgfx[-1] if -1 in blockgfx else r"gfx/player/primitive.png")
+	BLOCKGFX.update(loadLevelTiles(BLOCKS_NAME_TO_ID, blockgfx)) # loaded and converted only once per process
 
 
 # loads the number graphics, if possible
@@ -103,22 +124,34 @@ def loadNumberGraphics():
 	if os.path.isdir(numberpath):
 		NUMBERS = list()
 		for i in range(10):
-			NUMBERS.append(pg.image.load(numberpath + str(i) + r".png"))
+			NUMBERS.append(convertSurface(pg.image.load(numberpath + str(i) + r".png")))
 		print("Number graphics found and loaded.")
 
 
-# chooses a random worldfile matching the pattern from the given directory
-def chooseWorld(worlddir, pattern):
-	return worlddir + random.choice([f for f in os.listdir(worlddir) if fnmatch(f, pattern)])
-
-
 # initialize stuff that has to be initialized once
 def init():
-	global SCREEN, FONT, NUMBERS
+	global SCREEN, FONT, NUMBERS, OBSERVATION_CHANNEL, OBSERVATION_RENDERER, FRAME_HISTORY, FRAME_HISTORY_CHANNEL, SEED, RUN_RANDOM, ACTION_LOG, LEVEL_PREFETCHER
+
+	# init random number generators
+	if SEED is None:
+		SEED = createSeed()
+	print("Seed: ", SEED)
+	random.seed(SEED)
+	RUN_RANDOM = random.Random(SEED)
+	LEVEL_CACHE.maxLevels = LEVEL_CACHE_SIZE
+
+	# init level prefetching (the levels are chosen in the background thread from then on)
+	if LEVEL_PREFETCH_DEPTH > 0:
+		from levelPrefetcher import LevelPrefetcher
+		LEVEL_PREFETCHER = LevelPrefetcher(pickNextWorld, LEVEL_PREFETCH_DEPTH, MODE == 0)
 
 	# init pygame
+	# nothing is shown in fast forward mode, so the screen is only drawn offscreen (for the screenshots) and no window is opened
 	pg.init()
-	SCREEN = pg.display.set_mode(SCREEN_RESOLUTION, pg.constants.DOUBLEBUF)
+	if CLOCK_MODE == 1:
+		SCREEN = pg.Surface(SCREEN_RESOLUTION)
+	else:
+		SCREEN = pg.display.set_mode(SCREEN_RESOLUTION, pg.constants.DOUBLEBUF)
 	tmp = 1 if FPS == 0 else int(1000/FPS)
 	pg.key.set_repeat(1, tmp)
 
@@ -127,6 +160,34 @@ def init():
 	if not NUMBERS:
 		FONT = pg.font.SysFont(None, 64)
 
+	# init renderer for screenshots in the size needed by the AI
+	if OBSERVATION_SIZE and SCREENSHOTS_ACTIVE:
+		from observationRenderer import ObservationRenderer
+		OBSERVATION_RENDERER = ObservationRenderer(OBSERVATION_SIZE[:2], OBSERVATION_SIZE[2])
+
+	# init observation channel
+	if OBSERVATION_CHANNEL_PATH:
+		from observationChannel import ObservationWriter
+		shape = (OBSERVATION_SIZE[1], OBSERVATION_SIZE[0], OBSERVATION_SIZE[2]) if OBSERVATION_RENDERER else (SCREENSHOT_CURRENT_SIZE[1], SCREENSHOT_CURRENT_SIZE[0], 3)
+		OBSERVATION_CHANNEL = ObservationWriter(OBSERVATION_CHANNEL_PATH, shape)
+		print("Observation channel created: ", OBSERVATION_CHANNEL_PATH)
+
+	# init history of older screenshots
+	if SCREENSHOT_OLD_COUNT > 0:
+		from frameHistory import FrameHistory
+		shape = (OBSERVATION_SIZE[1], OBSERVATION_SIZE[0], OBSERVATION_SIZE[2]) if OBSERVATION_RENDERER else (SCREENSHOT_OLD_SIZE[1], SCREENSHOT_OLD_SIZE[0], 3)
+		FRAME_HISTORY = FrameHistory(SCREENSHOT_OLD_COUNT, shape)
+		if FRAME_HISTORY_CHANNEL_PATH:
+			from observationChannel import ObservationWriter
+			FRAME_HISTORY_CHANNEL = ObservationWriter(FRAME_HISTORY_CHANNEL_PATH, (SCREENSHOT_OLD_COUNT * shape[0], shape[1], shape[2]))
+			print("Frame history channel created: ", FRAME_HISTORY_CHANNEL_PATH)
+
+	# init action log
+	if ACTION_LOG_PATH:
+		from actionLog import ActionLogWriter
+		ACTION_LOG = ActionLogWriter(ACTION_LOG_PATH)
+		print("Recording actions to: ", ACTION_LOG_PATH)
+
 
 # initializes/resets statistic variables and logs statistics to the statistics file
 def resetStatistics():
@@ -167,56 +228,89 @@ def resetStatistics():
 # initialize stuff that has to be initialized per level
 def init_world(worldpath):
 	# load world
-	global BLOCKS_NAME_TO_ID, BLOCKS_ID_TO_NAME, WORLD, SPAWNPOS, GOALPOS, PLAYERPOS, POSITION_X_HISTORY, SCORE, SCREEN_SIZE_BLOCKS, MOVES_COUNT, COIN_COUNT, DEATH_COUNT, LEVEL_COUNT, SCORE_TOTAL, STATISTICS_FILE, FRAME_COUNTER_OLD, WORLDNAME, WORLDCOUNT
+	global BLOCKS_NAME_TO_ID, BLOCKS_ID_TO_NAME, WORLD, SPAWNPOS, GOALPOS, DISTANCE_MAP, PLAYERPOS, POSITION_X_HISTORY, SCORE, SCREEN_SIZE_BLOCKS, MOVES_COUNT, COIN_COUNT, DEATH_COUNT, LEVEL_COUNT, SCORE_TOTAL, STATISTICS_FILE, FRAME_COUNTER_OLD, WORLDNAME, WORLDCOUNT, PREPARED_LEVEL
 	print("Loading world: {}".format(worldpath)) # debug info
 	SCORE_TOTAL = SCORE_TOTAL + SCORE # for statistics
-	info, BLOCKS_NAME_TO_ID, blockgfx, WORLD = loadWorld(worldpath)
-	BLOCKS_ID_TO_NAME = {v: k for k, v in BLOCKS_NAME_TO_ID.items()}
-	loadTileGraphics(blockgfx)
-	for k, v in info.items():
-		VARIABLES[k] = convertToNumberIfPossible(v)
-
-	# default needed variables
-	VARIABLES.setdefault('blocksize', 32)
-	VARIABLES.setdefault('jump_height', 3) # how many blocks the character will ascend when jumping
-	VARIABLES.setdefault('jump_width', 3) # for how many ticks the character will be "hovering" at the highest point of the jump - the maximum distance he can jump is actually higher
-	VARIABLES.setdefault('jump', 1) # how often character is able to jump before he has to touch ground again
+	if (worldpath == WORLDNAME) and (WORLD is not None): # same level again, the file doesn't need to be loaded
+		WORLD.reset()
+	else:
+		prepared = PREPARED_LEVEL if (PREPARED_LEVEL is not None) and (PREPARED_LEVEL.path == worldpath) else None
+		level = prepared.level if prepared else loadLevel(worldpath) # levels are only loaded once per process (see levelCache.py)
+		info, BLOCKS_NAME_TO_ID, blockgfx = level.info, level.blocks, level.blockgfx
+		WORLD = prepared.world if prepared else level.createWorld()
+		BLOCKS_ID_TO_NAME = {v: k for k, v in BLOCKS_NAME_TO_ID.items()}
+		loadTileGraphics(blockgfx)
+		variables = prepared.variables if prepared else {k: convertToNumberIfPossible(v) for k, v in info.items()} # converted in the background if prepared
+		for k in info.keys():
+			VARIABLES[k] = variables[k]
+
+		# default needed variables
+		simulation.setDefaultVariables(VARIABLES)
+
+		# distances to the goal for the AI (cached in the level directory after the first time)
+		if MODE == 0:
+			DISTANCE_MAP = prepared.distanceMap if prepared else loadDistanceMap(worldpath, WORLD, BLOCKS_NAME_TO_ID, VARIABLES)
+
+		# compute amount of blocks in both directions
+		# behavior in case of not "blocksize divides resolution" not examined
+		SCREEN_SIZE_BLOCKS = (int(SCREEN_RESOLUTION[0] / VARIABLES['blocksize']), int(SCREEN_RESOLUTION[1] / VARIABLES['blocksize']))
+		if OBSERVATION_RENDERER:
+			OBSERVATION_RENDERER.setScreenSizeBlocks(SCREEN_SIZE_BLOCKS)
+			OBSERVATION_RENDERER.setTiles(BLOCKGFX, BLOCKS_NAME_TO_ID, NUMBERS)
+	PREPARED_LEVEL = None
 	SCORE = VARIABLES['starting_score'] if 'starting_score' in VARIABLES else 0 # what the score is at the beginning
-	VARIABLES.setdefault('coin_worth', 5) # how many points one coin gives
-	VARIABLES.setdefault('death_worth', -10) # how many points the character will lose if he dies
-	VARIABLES.setdefault('goal_worth', 100) # how many points the player will get if he reaches the goal
-
-	# compute amount of blocks in both directions
-	# behavior in case of not "blocksize divides resolution" not examined
-	SCREEN_SIZE_BLOCKS = (int(SCREEN_RESOLUTION[0] / VARIABLES['blocksize']), int(SCREEN_RESOLUTION[1] / VARIABLES['blocksize']))
-
-	# find spawn and goal position
-	SPAWNPOS = None
-	GOALPOS = None
-	for y in range(len(WORLD)):
-		for x in range(len(WORLD[y])):
-			if WORLD[y][x] == BLOCKS_NAME_TO_ID['SPAWN']:
-				SPAWNPOS = (x, y)
-			elif WORLD[y][x] == BLOCKS_NAME_TO_ID['GOAL']:
-				GOALPOS = (x, y)
-		if (SPAWNPOS is not None) and (GOALPOS is not None): break
+
+	# spawn and goal position (found when the world was loaded)
+	SPAWNPOS, GOALPOS = WORLD.spawnpos, WORLD.goalpos
 	PLAYERPOS = SPAWNPOS
 	POSITION_X_HISTORY = [PLAYERPOS[0]]
 
 	resetStatistics()
 
 	WORLDNAME = worldpath # set worldname to currently loaded level
+	if ACTION_LOG:
+		ACTION_LOG.beginEpisode(worldpath, EPISODE_SEED)
 	if WORLDCOUNT:
 		AIConnector.increaseWorldCount()
 		print("World count increased to: ", AIConnector.getWorldCount()) # debug
 
 	# draw world and take screenshot, if activated
+	drawLevelSurface()
 	x_offset, y_offset = computeWorldOffset()
 	draw(x_offset, y_offset)
 	if SCREENSHOTS_ACTIVE:
 		takeScreenshot()
 
 
+# chooses the level for the next episode, using a new episode seed
+# the level is taken from the prefetcher, if it is running
+def chooseNextWorld():
+	global EPISODE_SEED, PREPARED_LEVEL
+	if LEVEL_PREFETCHER:
+		PREPARED_LEVEL = LEVEL_PREFETCHER.next()
+		EPISODE_SEED = PREPARED_LEVEL.episodeSeed
+		return PREPARED_LEVEL.path
+	worldpath, EPISODE_SEED, PREPARED_LEVEL = pickNextWorld()
+	return worldpath
+
+
+# returns the path and the seed of the next episode and the level if it had to be prepared for the choice (levelPrefetcher.PreparedLevel, otherwise None)
+# called by the prefetcher in its thread, if it is running
+# levels in which the goal can't be reached are skipped in AI mode (see SKIP_UNREACHABLE_LEVELS)
+def pickNextWorld():
+	for attempt in range(SKIP_ATTEMPTS):
+		episodeSeed = RUN_RANDOM.getrandbits(32)
+		worldpath = chooseEpisodeWorld(LEVEL_PREFIX, LEVEL_PATTERN, episodeSeed)
+		if (MODE != 0) or (not SKIP_UNREACHABLE_LEVELS):
+			return worldpath, episodeSeed, None
+		prepared = prepareLevel(worldpath, episodeSeed, True) # the level is loaded only once, init_world uses it
+		if prepared.distanceMap.isReachable():
+			return worldpath, episodeSeed, prepared
+		print("Skipping level, the goal can't be reached: {}".format(worldpath))
+	print("No reachable level found after {} attempts, playing anyway: {}".format(SKIP_ATTEMPTS, worldpath))
+	return worldpath, episodeSeed, prepared
+
+
 # draw the score
 def drawScore():
 	position = VARIABLES['score_position'] if 'score_position' in VARIABLES else -1 # -1 = left, 0 = center, 1 = right
@@ -243,89 +337,96 @@ def drawScore():
 		SCREEN.blit(f, (xpos, 0))
 
 
+# draws the tile at the given world position onto the level surface
+def drawTile(x, y):
+	blocksize = VARIABLES['blocksize']
+	xpos = x * blocksize
+	ypos = y * blocksize
+	block = WORLD.get(x, y)
+	if (block != BLOCKS_NAME_TO_ID['AIR']) and (block != BLOCKS_NAME_TO_ID['GROUND']):
+		LEVEL_SURFACE.blit(BLOCKGFX[BLOCKS_NAME_TO_ID['AIR']], (xpos, ypos)) # draw air background for anything except GROUND and AIR
+	LEVEL_SURFACE.blit(BLOCKGFX[block], (xpos, ypos))
+
+
+# draws the whole level onto the level surface (called once per level, changes are drawn with drawTile)
+def drawLevelSurface():
+	global LEVEL_SURFACE
+	if (OBSERVATION_RENDERER or not SCREENSHOTS_ACTIVE) and (CLOCK_MODE == 1): # the full screen is never needed
+		return
+	blocksize = VARIABLES['blocksize']
+	LEVEL_SURFACE = pg.Surface((WORLD.width * blocksize, WORLD.height * blocksize))
+	LEVEL_SURFACE.fill((0, 0, 0))
+	for y in range(WORLD.height):
+		for x in range(WORLD.width):
+			if WORLD.get(x, y) != BLOCK_OUTSIDE: # rows can be shorter than the world is wide
+				drawTile(x, y)
+
+
 # draw the world
 def draw(x_offset=0, y_offset=0):
-	SCREEN.fill((0, 0, 0))
+	if (OBSERVATION_RENDERER or not SCREENSHOTS_ACTIVE) and not SHOW_FRAME: # the screen is neither needed for a screenshot nor shown
+		return
 	blocksize = VARIABLES['blocksize']
-	for y in range(SCREEN_SIZE_BLOCKS[1]):
-		if (y + y_offset < 0) or (y + y_offset >= len(WORLD)):
-			continue
-		for x in range(SCREEN_SIZE_BLOCKS[0]):
-			if (x + x_offset < 0) or (x + x_offset >= len(WORLD[y])):
-				continue
-			xpos = x * blocksize
-			ypos = y * blocksize
-			block = WORLD[y + y_offset][x + x_offset]
-			if (block != BLOCKS_NAME_TO_ID['AIR']) and (block != BLOCKS_NAME_TO_ID['GROUND']):
-				SCREEN.blit(BLOCKGFX[BLOCKS_NAME_TO_ID['AIR']], (xpos, ypos)) # draw air background for anything except GROUND and AIR
-			SCREEN.blit(BLOCKGFX[block], (xpos, ypos))
+	if (WORLD.width < SCREEN_SIZE_BLOCKS[0]) or (WORLD.height < SCREEN_SIZE_BLOCKS[1]): # world doesn't cover the whole screen
+		SCREEN.fill((0, 0, 0))
+	SCREEN.blit(LEVEL_SURFACE, (0, 0), pg.Rect(x_offset * blocksize, y_offset * blocksize, SCREEN_RESOLUTION[0], SCREEN_RESOLUTION[1])) # visible part of the level
 	SCREEN.blit(BLOCKGFX[-1], ((PLAYERPOS[0] - x_offset) * blocksize, (PLAYERPOS[1] - y_offset) * blocksize))
 	drawScore()
-	pg.display.flip()
+	if SHOW_FRAME:
+		pg.display.flip()
 
 
 # auxiliary method - returns block at given position or None if outside of world
 def getBlockAt(coord):
-	x, y = coord
-	if (y < 0) or (y >= len(WORLD)):
-		return None
-	if (x < 0) or (x >= len(WORLD[y])):
-		return None
-	return WORLD[y][x]
+	return simulation.getBlockAt(WORLD, coord)
 
 
-# computes the next position of the player
-# also handles gravity and collision detection
+# computes the next position of the player (see simulation.movePlayer)
 # returns a list of flags (events triggered by the movement, e.g. contact with an enemy)
 def movePlayer(direction, jumpingPhase):
 	global PLAYERPOS
-	movementFlags = set()
-	# move player up/down
-	if jumpingPhase == 0: # apply gravity
-		block = getBlockAt((PLAYERPOS[0], PLAYERPOS[1] + 1)) # get block below player
-		if block == None:
-			movementFlags.add('fall')
-			return movementFlags # player fell off the world
-		elif block != BLOCKS_NAME_TO_ID['GROUND']: # player will fall
-			PLAYERPOS = (PLAYERPOS[0], PLAYERPOS[1] + 1)
-	elif jumpingPhase > 0: # player is ascending
-		block = getBlockAt((PLAYERPOS[0], PLAYERPOS[1] - 1)) # get block above player
-		if (block != None) and (block != BLOCKS_NAME_TO_ID['GROUND']): # no obstacle above
-			PLAYERPOS = (PLAYERPOS[0], PLAYERPOS[1] - 1)
-	# elif jumpingPhase < 0: nothing to do here, player is "hovering" and will move neither up nor down
-
-	# move player left/right
-	block = getBlockAt((PLAYERPOS[0] + direction, PLAYERPOS[1]))
-	if (block == None) or (block == BLOCKS_NAME_TO_ID['GROUND']): # collision detection
-		movementFlags.add('not_moved')
-	else:
-		PLAYERPOS = (PLAYERPOS[0] + direction, PLAYERPOS[1])
+	PLAYERPOS, movementFlags = simulation.movePlayer(WORLD, BLOCKS_NAME_TO_ID, PLAYERPOS, direction, jumpingPhase)
+	if 'fall' in movementFlags:
+		return movementFlags # player fell off the world, position is unchanged
 
 	# add new position to history
 	POSITION_X_HISTORY.append(PLAYERPOS[0])
 	if len(POSITION_X_HISTORY) > POSITION_HISTORY_LENGTH:
 		POSITION_X_HISTORY.pop(0) # this is slow on lists, but deques wouldn't be faster in this case
 
-	# check current block / fill flaglist
-	if getBlockAt((PLAYERPOS[0], PLAYERPOS[1] + 1)) == BLOCKS_NAME_TO_ID['GROUND']:
-		movementFlags.add('on_ground') # player is on ground
-	block = getBlockAt(PLAYERPOS) # block where player is
-	if block == BLOCKS_NAME_TO_ID['ENEMY']:
-		movementFlags.add('hit_enemy')
-	elif block == BLOCKS_NAME_TO_ID['COIN']:
-		movementFlags.add('hit_coin')
-	elif block == BLOCKS_NAME_TO_ID['GOAL']:
-		movementFlags.add('hit_goal')
-
 	return movementFlags
 
 
-# freezes the screen for some time. optionally clears it before
-def freeze(sec, clear=False):
+# freezes the screen for FREEZE_TICKS ticks. optionally clears it before
+# only real time mode actually waits, otherwise the ticks are just added to the simulation clock
+def freeze(clear=False):
+	global SIMULATION_TICKS
+	SIMULATION_TICKS = SIMULATION_TICKS + FREEZE_TICKS
+	if CLOCK_MODE != 0:
+		return
 	if clear:
 		SCREEN.fill((0, 0, 0))
 		pg.display.flip()
-	time.sleep(sec)
+	if FPS > 0:
+		time.sleep(FREEZE_TICKS / float(FPS))
+
+
+# advances the simulation clock by one tick and decides wether the frame is shown on the display
+# waits for the FPS limit in real time mode
+def updateClock(clock):
+	global SIMULATION_TICKS, SHOW_FRAME, LAST_DISPLAY_UPDATE
+	SIMULATION_TICKS = SIMULATION_TICKS + 1
+	if CLOCK_MODE == 0:
+		if FPS > 0:
+			clock.tick(FPS)
+		SHOW_FRAME = True
+	elif CLOCK_MODE == 2:
+		now = time.time()
+		SHOW_FRAME = now - LAST_DISPLAY_UPDATE >= 1.0 / WATCH_FPS
+		if SHOW_FRAME:
+			LAST_DISPLAY_UPDATE = now
+	else:
+		SHOW_FRAME = False
 
 
 # sets the parameters to give to the AI
@@ -334,6 +435,7 @@ def generateAIParams():
 	params["score"] = SCORE
 	params["x"] = PLAYERPOS[0]
 	params["xDistanceToGoal"] = GOALPOS[0] - PLAYERPOS[0]
+	params["distanceToGoal"] = DISTANCE_MAP.get(PLAYERPOS[0], PLAYERPOS[1], jumpingPhase, jumping) # in ticks, following the rules of the game (-1 = unreachable)
 	params["deathCount"] = DEATH_COUNT
 	params["levelBeatenCount"] = LEVEL_COUNT
 	params["worldname"] = WORLDNAME  # currently not used
@@ -358,40 +460,60 @@ def modifyScore(amount):
 # maximum offset = world size - screen size (in blocks)
 def computeWorldOffset():
 	x_offset = PLAYERPOS[0] - int(SCREEN_SIZE_BLOCKS[0] / 2)
-	x_offset = int(max(0, min(len(WORLD[0]) - SCREEN_SIZE_BLOCKS[0], x_offset)))
+	x_offset = int(max(0, min(WORLD.width - SCREEN_SIZE_BLOCKS[0], x_offset)))
 	y_offset = PLAYERPOS[1] - int(SCREEN_SIZE_BLOCKS[1] / 2)
-	y_offset = int(max(0, min(len(WORLD) - SCREEN_SIZE_BLOCKS[1], y_offset)))
+	y_offset = int(max(0, min(WORLD.height - SCREEN_SIZE_BLOCKS[1], y_offset)))
 	return x_offset, y_offset
 
 
 
+# takes the screenshot of the current frame and adds the downscaled frame to the history of older screenshots
 def takeScreenshot():
-	# rename old screenshots, if any
-	for sfile in sorted(os.listdir(SCREENSHOT_DIRECTORY), reverse=True):
-		if (not sfile.startswith(SCREENSHOT_CURRENT_NAME)) and sfile.startswith(SCREENSHOT_OLD_PREFIX):
-			sfcomp = os.path.splitext(sfile)  # split into name and extension
-			sfprefix = sfcomp[0][:len(SCREENSHOT_OLD_PREFIX)]
-			sfnumber = int(sfcomp[0][len(SCREENSHOT_OLD_PREFIX):])
-			if sfnumber >= SCREENSHOT_OLD_COUNT - 1:
-				os.remove(SCREENSHOT_DIRECTORY + sfile)
-			else:
-				os.rename(SCREENSHOT_DIRECTORY + sfile, "{}{}{:02d}{}".format(SCREENSHOT_DIRECTORY, sfprefix, sfnumber + 1, sfcomp[1]))
+	if OBSERVATION_RENDERER: # render screenshot directly in the size needed by the AI
+		x_offset, y_offset = computeWorldOffset()
+		frame = OBSERVATION_RENDERER.render(WORLD, PLAYERPOS, x_offset, y_offset, SCORE, VARIABLES['score_position'] if 'score_position' in VARIABLES else -1)
+		if OBSERVATION_CHANNEL:
+			OBSERVATION_CHANNEL.write(frame)
+		else:
+			pg.image.save(pg.image.frombuffer(frame.repeat(3 // frame.shape[2], axis=2).tobytes(), OBSERVATION_SIZE[:2], "RGB"), SCREENSHOT_DIRECTORY + SCREENSHOT_CURRENT_NAME + SCREENSHOT_EXTENSION)
+		if FRAME_HISTORY:
+			addToFrameHistory(frame)
+		return
+
 	# create new screenshot
-	pg.image.save(pg.transform.scale(SCREEN, SCREENSHOT_CURRENT_SIZE), SCREENSHOT_DIRECTORY + SCREENSHOT_CURRENT_NAME + SCREENSHOT_EXTENSION)
-	if SCREENSHOT_OLD_COUNT > 0:
-		pg.image.save(pg.transform.scale(SCREEN, SCREENSHOT_OLD_SIZE), SCREENSHOT_DIRECTORY + SCREENSHOT_OLD_PREFIX + "00" + SCREENSHOT_EXTENSION)
+	if OBSERVATION_CHANNEL:
+		OBSERVATION_CHANNEL.write(pg.image.tostring(pg.transform.scale(SCREEN, SCREENSHOT_CURRENT_SIZE), "RGB")) # raw pixels, no png encoding
+	else:
+		pg.image.save(pg.transform.scale(SCREEN, SCREENSHOT_CURRENT_SIZE), SCREENSHOT_DIRECTORY + SCREENSHOT_CURRENT_NAME + SCREENSHOT_EXTENSION)
+	if FRAME_HISTORY:
+		addToFrameHistory(pg.image.tostring(pg.transform.scale(SCREEN, SCREENSHOT_OLD_SIZE), "RGB"))
+
+
+# adds a frame to the history of older screenshots and hands the history to the AI (frame history channel and/or files)
+def addToFrameHistory(frame):
+	FRAME_HISTORY.add(frame)
+	if FRAME_HISTORY_CHANNEL:
+		FRAME_HISTORY_CHANNEL.write(FRAME_HISTORY.getStack())
+	if SCREENSHOT_OLD_TO_DISK:
+		FRAME_HISTORY.spill(SCREENSHOT_DIRECTORY, SCREENSHOT_OLD_PREFIX, SCREENSHOT_EXTENSION)
 
 
 # main
 loadPaths(r"paths.txt")
 init()
-init_world(chooseWorld(LEVEL_PREFIX, LEVEL_PATTERN))
+init_world(chooseNextWorld())
 
 # start AI
 if MODE == 0:
 	print("Initializing AI ...")
-	import AIConnector
+	if AGENT_SERVER_PATH:
+		import agentClient as AIConnector
+		print("Connected to agent server: ", AIConnector.connect(AGENT_SERVER_PATH))
+	else:
+		import AIConnector
 	print("Setting AI screenshot folder to: ", 	AIConnector.setScreenshotPath(SCREENSHOT_DIRECTORY + SCREENSHOT_CURRENT_NAME + SCREENSHOT_EXTENSION))
+	if OBSERVATION_CHANNEL:
+		print("Setting AI observation channel to: ", AIConnector.setObservationChannelPath(OBSERVATION_CHANNEL_PATH))
 	print("AI Initialization complete.")
 	print("AI Action Count: ", AIConnector.getActionCount())
 	AIConnector.increaseWorldCount() # compensate for missed call in init_world
@@ -429,31 +551,35 @@ Possible flags:
 '''
 movementFlags = set()
 clock = pg.time.Clock()
-freezeTime = 0 if FPS == 0 else (1.0/FPS) * 5
+aiAction = ACTION_NO_ACTION # last action chosen by the AI
+aiReload = AIConnector.getReload() if MODE == 0 else False # wether the AI requested a new level (with its last action)
+aiActionCount = AIConnector.getActionCount() if MODE == 0 else 0 # action counter of the AI
+repeatLeft = 0 # for how many more ticks aiAction is repeated
 while gameRunning:
-	if FPS > 0:
-		clock.tick(FPS)
+	updateClock(clock)
 	movementFlags.clear()
 	move = 0
 	action = ACTION_NO_ACTION
 
 	if MODE == 0: # game is played by the AI
-		# check wether a new level was requested by the AI
-		if AIConnector.getReload():
-			freeze(freezeTime)
-			freeze(freezeTime, True)
-			jumping = 0
-			jumpingPhase = 0
-			init_world(chooseWorld(LEVEL_PREFIX, LEVEL_PATTERN))
-		# check if maximum amount of training frames is reached
-		if 0 < MAX_TRAINED_FRAMES < AIConnector.getActionCount():
-			print("Set number of frames to train reached ({}). The game will now quit.".format(MAX_TRAINED_FRAMES))
-			gameRunning = False
-			break
-		# set parameters for AI script
-		AIConnector.setParams(generateAIParams())
-		# run AI script
-		action = AIConnector.getAction()
+		if repeatLeft == 0: # let the AI choose a new action
+			# check wether a new level was requested by the AI
+			if aiReload:
+				freeze()
+				freeze(True)
+				jumping = 0
+				jumpingPhase = 0
+				init_world(chooseNextWorld())
+			# check if maximum amount of training frames is reached
+			if 0 < MAX_TRAINED_FRAMES < aiActionCount:
+				print("Set number of frames to train reached ({}, {} ticks). The game will now quit.".format(MAX_TRAINED_FRAMES, SIMULATION_TICKS))
+				gameRunning = False
+				break
+			# set parameters for AI script and run it (one call)
+			aiAction, aiReload, aiActionCount = AIConnector.step(generateAIParams())
+			repeatLeft = ACTION_REPEAT
+		repeatLeft = repeatLeft - 1
+		action = aiAction
 	# elif MODE == 1: # game is played by a human
 	events = pg.event.get()
 	for ev in events:
@@ -477,37 +603,31 @@ while gameRunning:
 		print("Frame: {}".format(FRAME_COUNTER))
 
 	# progress action
-	if action == ACTION_RIGHT:
-		move = 1
-	elif action == ACTION_LEFT:
-		move = -1
-	elif action == ACTION_JUMP:
-		if jumping < VARIABLES['jump']: # character can still jump
-			jumping += 1
-			jumpingPhase = VARIABLES['jump_height']
+	move, jumping, jumpingPhase = simulation.applyAction(action, jumping, jumpingPhase, VARIABLES)
 
 	# update move statistics
 	MOVES_COUNT[action] = MOVES_COUNT[action] + 1
+	if ACTION_LOG:
+		ACTION_LOG.addAction(action)
 
 	# update player movement
 	movementFlags = movePlayer(move, jumpingPhase)
 
 	# update jumping state
-	if (jumpingPhase > 1) or (jumpingPhase < 0):
-		jumpingPhase -= 1
-	elif jumpingPhase == 1:
-		jumpingPhase = -1
-	if jumpingPhase < (-1) * VARIABLES['jump_width']: # end of hovering
-		jumpingPhase = 0
+	jumpingPhase = simulation.updateJumpingPhase(jumpingPhase, VARIABLES)
 
 	# compute offset
 	x_offset, y_offset = computeWorldOffset()
 
+	# the AI only sees the last tick of a repeated action (or the tick in which the level is beaten)
+	lastTick = (repeatLeft == 0) or ('hit_goal' in movementFlags)
+
 	# draw world
-	draw(x_offset, y_offset)
+	if lastTick or SHOW_FRAME:
+		draw(x_offset, y_offset)
 
 	# take screenshots (if activated)
-	if SCREENSHOTS_ACTIVE:
+	if SCREENSHOTS_ACTIVE and lastTick:
 		takeScreenshot()
 
 	# interprete movementFlags
@@ -516,11 +636,13 @@ while gameRunning:
 			modifyScore(VARIABLES['death_worth'])
 			DEATH_COUNT = DEATH_COUNT + 1
 			PLAYERPOS = SPAWNPOS
-			freeze(freezeTime)
-			freeze(freezeTime, True)
+			freeze()
+			freeze(True)
 		elif flag == 'hit_coin': # remove coin and grant points
 			if getBlockAt(PLAYERPOS) == BLOCKS_NAME_TO_ID['COIN']: # should always be the case, just to be sure ...
-				WORLD[PLAYERPOS[1]][PLAYERPOS[0]] = BLOCKS_NAME_TO_ID['AIR'] # remove coin
+				WORLD.set(PLAYERPOS[0], PLAYERPOS[1], BLOCKS_NAME_TO_ID['AIR']) # remove coin
+				if LEVEL_SURFACE is not None:
+					drawTile(PLAYERPOS[0], PLAYERPOS[1])
 				modifyScore(VARIABLES['coin_worth']) # grant points
 				COIN_COUNT = COIN_COUNT + 1 # update statistics
 		elif flag == 'hit_goal':
@@ -536,17 +658,27 @@ while gameRunning:
 				AIConnector.getAction() # dummy AI call, ignore return value
 				FRAME_COUNTER = FRAME_COUNTER + 1 # synchronize FRAME_COUNTER with AIConnector.getActionCount()
 			'''
-			freeze(freezeTime)
-			freeze(freezeTime, True)
+			freeze()
+			freeze(True)
 			jumping = 0
 			jumpingPhase = 0
+			repeatLeft = 0 # the AI chooses the first action in the new level
 			# load random new level
-			init_world(chooseWorld(LEVEL_PREFIX, LEVEL_PATTERN))
+			init_world(chooseNextWorld())
 		elif flag == 'on_ground': # update jumping
 			jumping = 0
 			jumpingPhase = 0
 
 # end stuff
+print("Level cache: {} hits, {} misses ({:.1%} hit rate)".format(LEVEL_CACHE.hits, LEVEL_CACHE.misses, LEVEL_CACHE.getHitRate()))
+if LEVEL_PREFETCHER:
+	LEVEL_PREFETCHER.stop()
 STATISTICS_FILE.close()
+if ACTION_LOG:
+	ACTION_LOG.close()
+if OBSERVATION_CHANNEL:
+	OBSERVATION_CHANNEL.close()
+if FRAME_HISTORY_CHANNEL:
+	FRAME_HISTORY_CHANNEL.close()
 if MODE == 0:
 	AIConnector.cleanup()
@@ -0,0 +1,105 @@
+import os
+import threading
+from fnmatch import fnmatch
+from collections import OrderedDict
+
+from worldSaver import loadWorld, getLevelFile
+from worldGrid import WorldGrid
+
+
+# a loaded level, which is never changed (don't change its dicts either)
+# the world to play in is created with createWorld(), it is a copy of the level's pristine blocks
+class CachedLevel:
+
+	def __init__(self, path, stat, info, blocks, blockgfx, grid):
+		self.path = path
+		self.stat = stat # (modification time, size) of the level file when it was loaded
+		self.info = info
+		self.blocks = blocks
+		self.blockgfx = blockgfx
+		self.grid = grid # worldGrid.WorldGrid as loaded, only copied
+		self.spawnpos = grid.spawnpos
+		self.goalpos = grid.goalpos
+
+	# returns a new worldGrid.WorldGrid of the level
+	def createWorld(self):
+		return self.grid.copy()
+
+
+'''
+Cache for loaded levels, keyed by the path of the level file.
+Every level is loaded only once (as long as it stays in the cache and the file doesn't change), loading it again only copies its blocks.
+If more than maxLevels levels are cached, the least recently used one is dropped. The level file is checked with os.stat on every get(),
+so changed levels are loaded again. Can be used from several threads (e.g. by the level prefetcher).
+'''
+class LevelCache:
+
+	def __init__(self, maxLevels=1024):
+		self.maxLevels = maxLevels
+		self.levels = OrderedDict() # path -> CachedLevel, least recently used first
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	# returns the level (CachedLevel) from the given file
+	def get(self, path):
+		stat = os.stat(getLevelFile(path))
+		stat = (stat.st_mtime_ns, stat.st_size)
+		with self.lock:
+			level = self.levels.get(path)
+			if (level is not None) and (level.stat == stat):
+				self.levels.move_to_end(path)
+				self.hits += 1
+				return level
+			self.misses += 1
+		info, blocks, blockgfx, world = loadWorld(path)
+		level = CachedLevel(path, stat, info, blocks, blockgfx, WorldGrid(world, blocks))
+		with self.lock:
+			self.levels[path] = level
+			self.levels.move_to_end(path)
+			while len(self.levels) > self.maxLevels:
+				self.levels.popitem(last=False)
+		return level
+
+	# returns the share of get() calls that didn't need to load the level
+	def getHitRate(self):
+		return self.hits / float(max(1, self.hits + self.misses))
+
+
+'''
+Catalog of the level files matching a pattern in a directory, so choosing a level doesn't need to list the directory every time.
+The list is only read again if the modification time of the directory changes (which happens when files are added, removed or renamed).
+'''
+class LevelCatalog:
+
+	def __init__(self):
+		self.entries = dict() # (directory, pattern) -> (modification time, sorted file names)
+		self.hits = 0
+		self.misses = 0
+
+	# returns the sorted names of the files in the directory matching the pattern (see fnmatch)
+	def list(self, directory, pattern):
+		mtime = os.stat(directory).st_mtime_ns
+		entry = self.entries.get((directory, pattern))
+		if (entry is not None) and (entry[0] == mtime):
+			self.hits += 1
+			return entry[1]
+		self.misses += 1
+		names = sorted(f for f in os.listdir(directory) if fnmatch(f, pattern)) # sorted, so the choice doesn't depend on the file system
+		self.entries[(directory, pattern)] = (mtime, names)
+		return names
+
+
+# process-wide cache and catalog
+CACHE = LevelCache()
+CATALOG = LevelCatalog()
+
+
+# returns the level from the given file using the process-wide cache
+def loadLevel(path):
+	return CACHE.get(path)
+
+
+# returns the sorted names of the level files matching the pattern in the directory using the process-wide catalog
+def listLevels(directory, pattern):
+	return CATALOG.list(directory, pattern)
@@ -0,0 +1,141 @@
+import os
+import sys
+import mmap
+import struct
+from fnmatch import fnmatch
+
+from worldSaver import loadWorld, compileWorld, decompileWorld, PACK_EXTENSION
+
+
+'''
+Level pack: many levels in one file, so choosing and loading a level doesn't need to list a directory or open a file.
+The pack is memory-mapped (read only), so all processes using the same pack share its pages.
+A level in a pack has the path <pack file>/<level name>, e.g. levels/training.pack/training_1.txt. So a pack can be used
+like a level directory (e.g. "levels/training.pack/" as level folder in paths.txt), worldSaver.loadWorld loads levels from it.
+
+File layout (all numbers little endian):
+	header: magic (4 bytes), version (uint16), number of levels (uint32), offset of the index (uint64)
+	levels: one compiled level after another (see worldSaver.compileWorld)
+	index: for each level: length of the name (uint16), offset (uint64) and size (uint32) of the compiled level, name (utf-8)
+'''
+MAGIC = b"LPAK"
+VERSION = 1
+HEADER_FORMAT = "<4sHIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = "<HQI"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+# open packs of this process (path -> LevelPack), see openPack
+PACKS = dict()
+
+
+# a level pack opened for reading
+class LevelPack:
+
+	def __init__(self, path):
+		self.path = path
+		stat = os.stat(path)
+		self.stat = (stat.st_mtime_ns, stat.st_size)
+		f = open(path, "rb")
+		try:
+			self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		finally:
+			f.close() # the memory map stays valid
+		magic, version, count, indexOffset = struct.unpack_from(HEADER_FORMAT, self.map)
+		if (magic != MAGIC) or (version != VERSION):
+			raise IOError("{} is not a level pack (version {})!".format(path, VERSION))
+		self.entries = dict() # level name -> (offset, size)
+		position = indexOffset
+		for i in range(count):
+			nameLength, offset, size = struct.unpack_from(ENTRY_FORMAT, self.map, position)
+			position = position + ENTRY_SIZE
+			self.entries[self.map[position:position + nameLength].decode("utf-8")] = (offset, size)
+			position = position + nameLength
+		self.names = sorted(self.entries) # sorted like the files of a level directory (see simulation.chooseWorld)
+		self.matches = dict() # pattern -> matching names
+
+	# returns the sorted names of the levels that match the pattern (see fnmatch)
+	def match(self, pattern):
+		if pattern not in self.matches:
+			self.matches[pattern] = [name for name in self.names if fnmatch(name, pattern)]
+		return self.matches[pattern]
+
+	# returns the level with the given name like worldSaver.loadWorld
+	def loadWorld(self, name):
+		if name not in self.entries:
+			raise IOError("There is no level {} in {}!".format(name, self.path))
+		offset, size = self.entries[name]
+		return decompileWorld(memoryview(self.map)[offset:offset + size])
+
+	def close(self):
+		self.map.close()
+
+
+# returns the level pack at the given path, every pack is only opened once per process (again if the file has been replaced)
+def openPack(path):
+	pack = PACKS.get(path)
+	if pack is not None:
+		stat = os.stat(path)
+		if pack.stat != (stat.st_mtime_ns, stat.st_size):
+			pack = None # old pack is closed when it isn't used anymore
+	if pack is None:
+		pack = LevelPack(path)
+		PACKS[path] = pack
+	return pack
+
+
+# writes a level pack
+# the pack is written to a temporary file and replaces an existing pack on close(), processes using the old one can go on with it
+class LevelPackWriter:
+
+	def __init__(self, path):
+		self.path = path
+		self.tmp = "{}.{}.tmp".format(path, os.getpid())
+		self.file = open(self.tmp, "wb")
+		self.file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, 0)) # written again on close
+		self.entries = list()
+		self.names = set()
+
+	# adds a level (as returned by worldSaver.loadWorld)
+	def add(self, name, level):
+		if name in self.names:
+			raise ValueError("Level {} is already in {}!".format(name, self.path))
+		data = compileWorld(level)
+		self.entries.append((name, self.file.tell(), len(data)))
+		self.names.add(name)
+		self.file.write(data)
+
+	# adds a level with the same arguments as worldSaver.saveWorld (the level is stored as if it was saved and loaded again)
+	def addWorld(self, name, world, BLOCKS_NAME_TO_ID={'AIR':0, 'GROUND':1, 'ENEMY':2, 'COIN':3, 'SPAWN':4, 'GOAL':5}, info={}, w_tiles={}):
+		info = {"{}".format(k): "{}".format(v) for k, v in info.items()}
+		blocks = {"{}".format(k).upper(): int(v) for k, v in BLOCKS_NAME_TO_ID.items()}
+		tiles = {int(k): "{}".format(v) for k, v in w_tiles.items()}
+		self.add(name, (info, blocks, tiles, world))
+
+	def close(self):
+		indexOffset = self.file.tell()
+		for name, offset, size in self.entries:
+			name = name.encode("utf-8")
+			self.file.write(struct.pack(ENTRY_FORMAT, len(name), offset, size))
+			self.file.write(name)
+		self.file.seek(0)
+		self.file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(self.entries), indexOffset))
+		self.file.close()
+		os.replace(self.tmp, self.path)
+
+
+# main
+# packs the given level files into a level pack (the levels get the names of the files) or lists the levels of a pack
+if __name__ == "__main__":
+	if (len(sys.argv) < 2) or (not sys.argv[1].endswith(PACK_EXTENSION)):
+		print("Usage: python levelPack.py <pack{}> [<level> ...]".format(PACK_EXTENSION))
+		sys.exit(1)
+	if len(sys.argv) == 2:
+		for name in openPack(sys.argv[1]).names:
+			print(name)
+		sys.exit(0)
+	writer = LevelPackWriter(sys.argv[1])
+	for level in sys.argv[2:]:
+		writer.add(os.path.basename(level), loadWorld(level))
+	writer.close()
+	print("{} levels packed into {}.".format(len(sys.argv) - 2, sys.argv[1]))
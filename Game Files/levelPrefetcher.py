@@ -0,0 +1,103 @@
+import sys
+import queue
+import threading
+from collections import namedtuple
+
+from utils import convertToNumberIfPossible
+from levelCache import loadLevel, CACHE
+from simulation import setDefaultVariables
+
+
+# a level loaded in advance
+# level: levelCache.CachedLevel, world: worldGrid.WorldGrid of the level, variables: info with default values,
+# distanceMap: distanceMap.DistanceMap of the level (None if not requested)
+PreparedLevel = namedtuple('PreparedLevel', ['path', 'episodeSeed', 'level', 'world', 'variables', 'distanceMap'])
+
+
+# loads a level with everything that can be done without graphics
+def prepareLevel(path, episodeSeed, distanceMap=False):
+	level = loadLevel(path)
+	world = level.createWorld()
+	variables = setDefaultVariables({k: convertToNumberIfPossible(v) for k, v in level.info.items()})
+	distances = None
+	if distanceMap:
+		from distanceMap import loadDistanceMap
+		distances = loadDistanceMap(path, world, level.blocks, variables)
+	return PreparedLevel(path, episodeSeed, level, world, variables, distances)
+
+
+'''
+Loads the levels of the next episodes in a background thread, so changing the level doesn't wait for reading and parsing files
+(or computing distance maps).
+chooseLevel() has to return the path and the seed of the next episode and the prepared level, if it already prepared it for the choice (None otherwise). It is only called in the background thread, in the order
+of the episodes, so a seeded choice gives the same levels as without prefetching. next() returns the prepared levels in the same order.
+'''
+class LevelPrefetcher:
+
+	# depth: how many levels are prepared in advance, distanceMap: wether the distance maps are loaded too
+	def __init__(self, chooseLevel, depth=2, distanceMap=False):
+		self.chooseLevel = chooseLevel
+		self.distanceMap = distanceMap
+		self.levels = queue.Queue(depth)
+		self.error = None # exception of the background thread, raised by every next() call once it has been reached
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name="LevelPrefetcher")
+		self.thread.daemon = True # doesn't keep the process alive
+		self.thread.start()
+
+	# background thread: prepares levels until the queue is full, then waits until one is taken
+	def run(self):
+		while self.running:
+			try:
+				path, episodeSeed, item = self.chooseLevel()
+				if item is None:
+					item = prepareLevel(path, episodeSeed, self.distanceMap)
+			except Exception as e: # handed to the caller of next()
+				item = e
+			while self.running:
+				try:
+					self.levels.put(item, timeout=0.1)
+					break
+				except queue.Full:
+					pass
+			if isinstance(item, Exception):
+				break
+
+	# returns the next prepared level (waits if it isn't ready yet)
+	# raises the exception of the background thread if preparing the level failed (again on every later call, the thread has ended)
+	def next(self):
+		if self.error is not None:
+			raise self.error
+		item = self.levels.get()
+		if isinstance(item, Exception):
+			self.error = item
+			raise item
+		return item
+
+	def stop(self):
+		self.running = False
+		self.thread.join()
+
+
+# main
+# checks that every level is loaded only once when it is chosen the way game.py does it in AI mode (prepared for the reachability check),
+# so the hit rate of the level cache only counts levels that are actually played again
+# arguments: level files (each one is played twice, at most as many as fit into the level cache)
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python levelPrefetcher.py <level> [<level> ...]")
+		sys.exit(1)
+	levels = sorted(set(sys.argv[1:]))[:CACHE.maxLevels]
+	for rounds in (1, 2):
+		queued = iter(levels)
+		def chooseLevel():
+			path = next(queued)
+			return path, 0, prepareLevel(path, 0, True)
+		prefetcher = LevelPrefetcher(chooseLevel, 2, True)
+		for path in levels:
+			if prefetcher.next().path != path:
+				raise AssertionError("The levels were prepared in the wrong order!")
+		prefetcher.stop()
+		if (CACHE.hits != (rounds - 1) * len(levels)) or (CACHE.misses != len(levels)):
+			raise AssertionError("After round {}: {} hits and {} misses for {} levels!".format(rounds, CACHE.hits, CACHE.misses, len(levels)))
+	print("{} levels played twice: {} hits, {} misses.".format(len(levels), CACHE.hits, CACHE.misses))
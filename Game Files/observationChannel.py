@@ -0,0 +1,99 @@
+import mmap
+import struct
+
+import numpy as np
+
+
+'''
+Observation channel: hands raw uint8 frames from the game to the agent through a memory mapped file (e.g. in /dev/shm),
+so no image encoding, decoding or file system operations are needed per frame.
+
+File layout (all numbers little endian):
+	header: magic (4 bytes), slot count, height, width, channels (uint32 each), sequence number of the newest frame (uint64)
+	slots: slot count times [sequence number of the frame in this slot (uint64), frame (height * width * channels bytes, row-wise, channels last)]
+Frame n (starting at 1) is written to slot (n % slot count). The sequence number of a slot is set to 0 while the slot is written,
+so readers can detect frames that have been overwritten while reading them.
+'''
+MAGIC = b"OBSC"
+HEADER_FORMAT = "<4sIIIIQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SEQUENCE_FORMAT = "<Q"
+SEQUENCE_SIZE = struct.calcsize(SEQUENCE_FORMAT)
+SEQUENCE_OFFSET = HEADER_SIZE - SEQUENCE_SIZE # position of the newest sequence number in the header
+
+
+# writes frames into the observation channel at the given path (the file is created or overwritten)
+# shape is (height, width, channels)
+class ObservationWriter:
+
+	def __init__(self, path, shape, slots=4):
+		self.path = path
+		self.shape = tuple(shape)
+		self.slots = slots
+		self.frameSize = self.shape[0] * self.shape[1] * self.shape[2]
+		self.slotSize = SEQUENCE_SIZE + self.frameSize
+		self.sequence = 0
+		size = HEADER_SIZE + slots * self.slotSize
+		f = open(path, "w+b")
+		f.truncate(size)
+		self.mm = mmap.mmap(f.fileno(), size)
+		f.close()
+		struct.pack_into(HEADER_FORMAT, self.mm, 0, MAGIC, slots, self.shape[0], self.shape[1], self.shape[2], 0)
+
+	# writes the next frame, which can be anything supporting the buffer protocol (bytes, numpy array, ...) with the size of one frame
+	# returns the sequence number of the frame
+	def write(self, frame):
+		self.sequence += 1
+		offset = HEADER_SIZE + (self.sequence % self.slots) * self.slotSize
+		struct.pack_into(SEQUENCE_FORMAT, self.mm, offset, 0) # mark slot as being written
+		self.mm[offset + SEQUENCE_SIZE:offset + self.slotSize] = memoryview(frame).cast("B")
+		struct.pack_into(SEQUENCE_FORMAT, self.mm, offset, self.sequence)
+		struct.pack_into(SEQUENCE_FORMAT, self.mm, SEQUENCE_OFFSET, self.sequence)
+		return self.sequence
+
+	def close(self):
+		self.mm.close()
+
+
+# reads frames from an observation channel created by ObservationWriter
+class ObservationReader:
+
+	def __init__(self, path):
+		self.path = path
+		f = open(path, "rb")
+		self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		f.close()
+		magic, self.slots, height, width, channels, _ = struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+		if magic != MAGIC:
+			raise IOError("{} is not an observation channel!".format(path))
+		self.shape = (height, width, channels)
+		self.frameSize = height * width * channels
+		self.slotSize = SEQUENCE_SIZE + self.frameSize
+		self.buffer = np.frombuffer(self.mm, dtype=np.uint8)
+
+	# returns the sequence number of the newest frame (0 if no frame has been written yet)
+	def getSequence(self):
+		return struct.unpack_from(SEQUENCE_FORMAT, self.mm, SEQUENCE_OFFSET)[0]
+
+	# returns the frame with the given sequence number (default: the newest one) as uint8 array of shape (height, width, channels)
+	# if copy is False, the returned array is a view into the channel and will be overwritten by later frames
+	# returns None if the frame is not available (anymore)
+	def read(self, sequence=None, copy=True):
+		if sequence is None:
+			sequence = self.getSequence()
+		if sequence == 0:
+			return None
+		offset = HEADER_SIZE + (sequence % self.slots) * self.slotSize
+		if struct.unpack_from(SEQUENCE_FORMAT, self.mm, offset)[0] != sequence:
+			return None
+		frame = self.buffer[offset + SEQUENCE_SIZE:offset + self.slotSize].reshape(self.shape)
+		if copy:
+			frame = frame.copy()
+			if struct.unpack_from(SEQUENCE_FORMAT, self.mm, offset)[0] != sequence: # overwritten while copying
+				return None
+		return frame
+
+	def close(self):
+		self.buffer = None
+		self.mm.close()
+
@@ -0,0 +1,119 @@
+import numpy as np
+import pygame as pg
+
+from worldGrid import BLOCK_OUTSIDE
+
+
+# weights for the conversion from RGB to grayscale (same as util.rgb2y on the lua side)
+GRAYSCALE_WEIGHTS = (0.21, 0.72, 0.07)
+
+# overlay for the player graphic
+OVERLAY_PLAYER = -1
+
+
+'''
+Renders the screen for the AI directly in the size it needs, without building the full resolution frame.
+All tiles are scaled down (and converted to grayscale, if only one channel is requested) once when the level is loaded.
+A frame is then put together from these small tiles and sampled to the requested size.
+Tiles with the player or a digit of the score drawn over them are created when they are needed for the first time.
+The score is only drawn if number graphics are given (see game.loadNumberGraphics).
+'''
+class ObservationRenderer:
+
+	# size: (width, height) of the observation in pixels, channels: 1 (grayscale) or 3 (RGB)
+	# screenSizeBlocks: how many blocks are visible in X and Y direction
+	def __init__(self, size, channels=1, screenSizeBlocks=(24, 20)):
+		self.size = tuple(size)
+		self.channels = channels
+		self.gfx = None
+		self.numbers = None
+		self.screenSizeBlocks = None
+		self.setScreenSizeBlocks(screenSizeBlocks)
+
+	# sets how many blocks are visible in X and Y direction
+	def setScreenSizeBlocks(self, screenSizeBlocks):
+		if self.screenSizeBlocks == tuple(screenSizeBlocks):
+			return
+		self.screenSizeBlocks = tuple(screenSizeBlocks)
+		# tiles are scaled to the smallest size that results in a frame at least as big as the observation
+		self.tileSize = (-(-self.size[0] // self.screenSizeBlocks[0]), -(-self.size[1] // self.screenSizeBlocks[1]))
+		composedWidth = self.tileSize[0] * self.screenSizeBlocks[0]
+		composedHeight = self.tileSize[1] * self.screenSizeBlocks[1]
+		# pixel positions in the composed frame that are sampled for the observation
+		self.rows = (np.arange(self.size[1]) * composedHeight // self.size[1])[:, None]
+		self.cols = np.arange(self.size[0]) * composedWidth // self.size[0]
+		if self.gfx is not None: # tiles have to be scaled again
+			self.setTiles(self.gfx, self.blocks, self.numbers)
+
+	# sets the graphics for the current level
+	# gfx: dict block id -> surface (the player graphic has id -1), blocks: block name -> id mapping, numbers: list of digit surfaces or None
+	def setTiles(self, gfx, blocks, numbers=None):
+		self.gfx = gfx
+		self.blocks = blocks
+		self.numbers = numbers
+		self.tileIndex = dict() # (block id, overlays) -> position in self.tiles
+		self.tileList = list()
+		self.tiles = None
+		self.blockOffset = -min(min(gfx.keys()), -1) + 1 # block ids are shifted by this for lookups, index 0 is outside of the world
+		self.lookup = np.zeros(max(gfx.keys()) + self.blockOffset + 1, dtype=np.intp)
+		self.lookup[0] = self.getTile(None)
+		for block in gfx.keys():
+			self.lookup[block + self.blockOffset] = self.getTile(block)
+
+	# returns the index of the tile showing the given block (None = outside of the world) with the given overlays drawn over it
+	# overlays is a tuple of OVERLAY_PLAYER and digits
+	def getTile(self, block, overlays=()):
+		key = (block, overlays)
+		if key not in self.tileIndex:
+			blocksize = self.gfx[self.blocks['AIR']].get_size()
+			surface = pg.Surface(blocksize)
+			surface.fill((0, 0, 0))
+			if block is not None:
+				if (block != self.blocks['AIR']) and (block != self.blocks['GROUND']):
+					surface.blit(self.gfx[self.blocks['AIR']], (0, 0)) # air background for anything except GROUND and AIR
+				surface.blit(self.gfx[block], (0, 0))
+			for overlay in overlays:
+				surface.blit(self.gfx[-1] if overlay == OVERLAY_PLAYER else self.numbers[overlay], (0, 0))
+			tile = pg.surfarray.array3d(pg.transform.smoothscale(surface, self.tileSize)).transpose(1, 0, 2) # (height, width, RGB)
+			if self.channels == 1:
+				tile = np.dot(tile, GRAYSCALE_WEIGHTS)[:, :, None]
+			self.tileIndex[key] = len(self.tileList)
+			self.tileList.append(np.clip(tile, 0, 255).astype(np.uint8))
+			self.tiles = None
+		return self.tileIndex[key]
+
+	# renders the visible part of the world (same as game.draw), world is a worldGrid.WorldGrid
+	# returns the observation as uint8 array of shape (height, width, channels)
+	def render(self, world, playerpos, x_offset=0, y_offset=0, score=None, scorePosition=-1):
+		sizeX, sizeY = self.screenSizeBlocks
+		# block ids of the visible part, shifted by blockOffset, 0 for outside of the world
+		visible = np.zeros((sizeY, sizeX), dtype=np.intp)
+		y0, y1 = max(0, y_offset), min(world.height, y_offset + sizeY)
+		x0, x1 = max(0, x_offset), min(world.width, x_offset + sizeX)
+		if (y0 < y1) and (x0 < x1):
+			cells = np.frombuffer(world.cells, dtype=np.int8).reshape(world.height + 2, world.stride)[y0 + 1:y1 + 1, x0 + 1:x1 + 1]
+			visible[y0 - y_offset:y1 - y_offset, x0 - x_offset:x1 - x_offset] = np.where(cells == BLOCK_OUTSIDE, -self.blockOffset, cells) + self.blockOffset
+		grid = self.lookup[visible]
+
+		# overlays (player and score)
+		overlays = dict()
+		overlays[(playerpos[0] - x_offset, playerpos[1] - y_offset)] = (OVERLAY_PLAYER,)
+		if (score is not None) and self.numbers:
+			if scorePosition == -1:
+				xpos = 0
+			elif scorePosition == 1:
+				xpos = sizeX - 4
+			else:
+				xpos = int(sizeX / 2) - 2
+			for i, z in enumerate(int((score // (10 ** e)) % 10) for e in reversed(range(4))):
+				overlays[(xpos + i, 0)] = overlays.get((xpos + i, 0), ()) + (z,)
+		for (x, y), o in overlays.items():
+			if (0 <= x < sizeX) and (0 <= y < sizeY):
+				grid[y, x] = self.getTile(world.getBlockAt(x + x_offset, y + y_offset), o)
+
+		# put the frame together from the tiles and sample it
+		if self.tiles is None:
+			self.tiles = np.array(self.tileList)
+		tileWidth, tileHeight = self.tileSize
+		frame = self.tiles[grid].transpose(0, 2, 1, 3, 4).reshape(sizeY * tileHeight, sizeX * tileWidth, self.channels)
+		return frame[self.rows, self.cols]
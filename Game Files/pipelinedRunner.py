@@ -0,0 +1,119 @@
+import sys
+import time
+
+from simulation import Simulation, readPaths
+from symbolicObservation import DEFAULT_WINDOW, CHANNEL_COUNT
+from agentServer import OBSERVATION_SYMBOLIC
+from agentClient import AgentConnection
+
+
+'''
+Plays many headless games (see simulation.py) in one process against an agent server (see agentServer.py), pipelined.
+A game can't go on before the agent has chosen its action, so a single game always waits for the agent. With several games,
+the requests are sent without waiting for the replies: the games are split into groups, and while the requests of one group are at the server,
+the other groups are simulated, observed and sent. So the work of the games overlaps with the inference instead of alternating with it.
+Every game has its own connection, so the server sees it as a separate game. Start the server with maxBatch = games per group,
+otherwise it waits maxWait seconds for the games of the other groups.
+
+Latency accounting per request: the latency is the time from sending the request until its reply has been read,
+the waited time is how long collecting the reply blocked. The difference is hidden behind the work on the other games.
+Usage:
+	runner = PipelinedRunner("/tmp/agentServer.sock", 8, groups=2, seed=42)
+	runner.run(10000)
+	print(runner.getHiddenShare())
+	runner.close()
+'''
+class PipelinedRunner:
+
+	def __init__(self, serverPath, gameCount, groups=2, pathsFile="paths.txt", window=DEFAULT_WINDOW, seed=0, actionRepeat=1):
+		levelDir, levelPattern, _, _ = readPaths(pathsFile)
+		self.window = window
+		self.shape = (window[1], window[0], CHANNEL_COUNT) # height, width, channels (see agentServer.OBSERVATION_SYMBOLIC)
+		self.sims = [Simulation(levelDir, levelPattern, window, actionRepeat, seed + k) for k in range(gameCount)]
+		self.connections = [AgentConnection(serverPath) for k in range(gameCount)]
+		self.groups = [list(range(g, gameCount, groups)) for g in range(groups)] # game indices of each group
+		self.worldCounts = [0] * gameCount
+		self.sent = [None] * gameCount # time the outstanding request of each game was sent (None if there is none)
+		# statistics
+		self.frames = 0
+		self.requests = 0
+		self.latency = 0.0 # summed over all requests
+		self.waited = 0.0 # summed over all requests
+		self.work = 0.0 # time spent simulating, observing and sending
+
+	# sends the request for the current frame of a game
+	def send(self, k):
+		sim = self.sims[k]
+		observation = sim.getSymbolicObservation()
+		self.connections[k].submit(sim.getParams(), self.worldCounts[k], OBSERVATION_SYMBOLIC, self.shape, observation.tobytes())
+		self.sent[k] = time.time()
+
+	# waits for the reply of a game, returns the action and wether the agent requested a new level
+	def collect(self, k):
+		start = time.time()
+		action, reload, _ = self.connections[k].collect()
+		end = time.time()
+		self.waited += end - start
+		self.latency += end - self.sent[k]
+		self.sent[k] = None
+		self.requests += 1
+		return action, reload
+
+	# plays the games until they have made the given number of steps together
+	def run(self, frames):
+		for k, sim in enumerate(self.sims):
+			if sim.world is None:
+				sim.reset()
+				self.worldCounts[k] += 1
+			if self.sent[k] is None:
+				self.send(k)
+		while self.frames < frames:
+			for group in self.groups:
+				for k in group:
+					action, reload = self.collect(k)
+					start = time.time()
+					sim = self.sims[k]
+					sim.step(action)
+					self.frames += 1
+					if reload or sim.done: # new level requested by the agent or goal reached
+						sim.reset()
+						self.worldCounts[k] += 1
+					self.send(k)
+					self.work += time.time() - start
+
+	# returns the average latency and the average waited time of the requests in seconds
+	def getAverageLatency(self):
+		count = float(max(1, self.requests))
+		return self.latency / count, self.waited / count
+
+	# returns the share of the latency that was hidden behind the work on other games
+	def getHiddenShare(self):
+		return 1.0 - self.waited / self.latency if self.latency > 0 else 0.0
+
+	# collects the outstanding replies and closes the connections
+	def close(self):
+		for k, connection in enumerate(self.connections):
+			if self.sent[k] is not None:
+				self.collect(k)
+			connection.close()
+		self.connections = list()
+
+
+# main
+# arguments: socket path of the agent server, optional: number of games, number of groups, total frames, paths file
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python pipelinedRunner.py <socket path> [<games> [<groups> [<frames> [<paths file>]]]]")
+		sys.exit(1)
+	games = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+	groups = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+	frames = int(sys.argv[4]) if len(sys.argv) > 4 else 10000
+	pathsFile = sys.argv[5] if len(sys.argv) > 5 else "paths.txt"
+	runner = PipelinedRunner(sys.argv[1], games, groups, pathsFile)
+	start = time.time()
+	runner.run(frames)
+	duration = time.time() - start
+	latency, waited = runner.getAverageLatency()
+	runner.close()
+	print("{} games in {} groups: {} frames in {:.2f}s ({:.0f} per second)".format(games, groups, runner.frames, duration, runner.frames / duration))
+	print("latency {:.3f}ms, waited {:.3f}ms, {:.0f}% of the latency hidden, {:.2f}s of work".format(latency * 1000, waited * 1000, runner.getHiddenShare() * 100, runner.work))
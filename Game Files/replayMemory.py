@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+'''
+Replay memory on the Python side, stored in memory-mapped files in one directory, so it is kept across runs without saving
+and only the parts in use are in memory. Every transition is stored once as struct of arrays:
+	frames: the observation before the action (uint8, frameShape), actions (uint8), rewards (float32), done (the episode ended with this transition),
+	worldCounts (uint32, the world count of the game, a change starts a new episode too) and the sampling priorities (see SumTree)
+The memory is a ring buffer, the oldest transitions are overwritten when it is full. The states fed to the network are the last historyLength frames,
+they are not stored but put together from the frames when sampling (frames from before the start of the episode are replaced by its first frame),
+so every frame is only stored once.
+Sampling gathers the frames of the whole batch with one np.take into arrays that are reused by the next sample() call.
+Prioritized sampling (proportional, see Schaul et al., "Prioritized Experience Replay") uses the priorities set by update(),
+new transitions get the highest priority so far. Transitions without a next frame (the newest one, and the last one of an episode that ended
+by a change of the world count without done) have priority 0 and are never sampled, so the targets don't bootstrap across episodes.
+Usage:
+	memory = ReplayMemory("learned/replayMemory", capacity=1000000, frameShape=(64, 64))
+	memory.add(frame, action, reward, done, worldCount)
+	batch = memory.sample(32)
+	memory.update(batch.indices, tdErrors)
+	memory.close()
+'''
+VERSION = 1
+META_FILE = "meta.json"
+ARRAY_EXTENSION = ".bin"
+PRIORITY_EPSILON = 1e-6 # added to the errors, so no transition gets priority 0
+
+# a sampled minibatch, states and nextStates are uint8 arrays (batch size, historyLength) + frameShape
+# weights are the importance sampling weights (all 1 for uniform sampling)
+Batch = namedtuple('Batch', ['indices', 'states', 'actions', 'rewards', 'nextStates', 'done', 'worldCounts', 'weights'])
+
+
+'''
+Sum tree over the priorities of the transitions: tree[1] is the sum of all priorities, the children of node n are 2n and 2n + 1,
+the priority of transition i is in leaf i + leafCount. So sampling proportional to the priorities and changing a priority both take log(leafCount) steps,
+which are done for the whole batch at once.
+'''
+class SumTree:
+
+	# tree: float64 array of size 2 * leafCount (leafCount a power of two)
+	def __init__(self, tree):
+		self.tree = tree
+		self.leafCount = len(tree) // 2
+		self.depth = self.leafCount.bit_length() - 1
+
+	def getTotal(self):
+		return self.tree[1]
+
+	# returns the priorities of the given transitions
+	def get(self, indices):
+		return self.tree[indices + self.leafCount]
+
+	# sets the priorities of the given transitions
+	def update(self, indices, priorities):
+		nodes = np.asarray(indices, dtype=np.intp) + self.leafCount
+		self.tree[nodes] = priorities
+		for _ in range(self.depth):
+			nodes = np.unique(nodes // 2)
+			self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+	# sets the priority of a single transition (faster than update() for one transition)
+	def set(self, index, priority):
+		tree = self.tree
+		node = index + self.leafCount
+		tree[node] = priority
+		node = node // 2
+		while node >= 1:
+			tree[node] = tree[2 * node] + tree[2 * node + 1]
+			node = node // 2
+
+	# returns the transitions at which the prefix sums of the priorities reach the given values
+	def find(self, values):
+		values = np.array(values, dtype=np.float64)
+		nodes = np.ones(len(values), dtype=np.intp)
+		for _ in range(self.depth):
+			left = 2 * nodes
+			leftSum = self.tree[left]
+			right = (values >= leftSum) & (self.tree[left + 1] > 0) # never go to an empty subtree because of rounding
+			values[right] -= leftSum[right]
+			nodes = left + right
+		return nodes - self.leafCount
+
+
+class ReplayMemory:
+
+	# opens the memory in the given directory, it is created with the given capacity, frame shape and history length if it doesn't exist
+	# alpha: how much the priorities count (0: uniform, 1: proportional to the errors)
+	def __init__(self, directory, capacity=1000000, frameShape=(64, 64), historyLength=4, alpha=0.6, seed=None):
+		self.directory = directory
+		self.alpha = alpha
+		self.random = np.random.RandomState(seed)
+		metaPath = os.path.join(directory, META_FILE)
+		if os.path.exists(metaPath):
+			f = open(metaPath, "r")
+			meta = json.load(f)
+			f.close()
+			if meta["version"] != VERSION:
+				raise IOError("{} is a replay memory of version {}, expected {}!".format(directory, meta["version"], VERSION))
+			capacity, frameShape, historyLength = meta["capacity"], meta["frameShape"], meta["historyLength"]
+			self.position, self.count, self.maxPriority = meta["position"], meta["count"], meta["maxPriority"]
+			mode = "r+"
+		else:
+			if not os.path.exists(directory):
+				os.makedirs(directory)
+			self.position = 0 # where the next transition is written
+			self.count = 0 # number of stored transitions
+			self.maxPriority = 1.0
+			mode = "w+" # the files are created sparse, so only written transitions take up disk space
+		self.capacity = capacity
+		self.frameShape = tuple(frameShape)
+		self.historyLength = historyLength
+		self.frames = self.openArray("frames", np.uint8, (capacity,) + self.frameShape, mode)
+		self.actions = self.openArray("actions", np.uint8, (capacity,), mode)
+		self.rewards = self.openArray("rewards", np.float32, (capacity,), mode)
+		self.done = self.openArray("done", np.bool_, (capacity,), mode)
+		self.worldCounts = self.openArray("worldCounts", np.uint32, (capacity,), mode)
+		leafCount = 1 << max(0, capacity - 1).bit_length()
+		self.priorities = SumTree(self.openArray("priorities", np.float64, (2 * leafCount,), mode))
+		self.buffers = dict() # reused arrays for the sampled frames
+		if mode == "w+":
+			self.flush()
+
+	def openArray(self, name, dtype, shape, mode):
+		return np.memmap(os.path.join(self.directory, name + ARRAY_EXTENSION), dtype=dtype, mode=mode, shape=shape)
+
+	# adds a transition: the frame observed before the action, the action, the reward for it, wether the episode ended and the world count
+	def add(self, frame, action, reward, done, worldCount):
+		p = self.position
+		previous = (p - 1) % self.capacity
+		self.frames[p] = frame
+		self.actions[p] = action
+		self.rewards[p] = reward
+		self.done[p] = done
+		self.worldCounts[p] = worldCount
+		# a transition can be sampled as soon as its next frame is stored (or right away if the episode ended with it)
+		# if the world count changed without done (e.g. the agent requested a new level), the previous transition has no next frame,
+		# so its priority stays 0 and it is never sampled
+		self.priorities.set(p, self.maxPriority if done else 0.0)
+		if (self.count > 0) and (not self.done[previous]) and (self.worldCounts[previous] == worldCount):
+			self.priorities.set(previous, self.maxPriority)
+		self.position = (p + 1) % self.capacity
+		self.count = min(self.count + 1, self.capacity)
+
+	# returns the indices of the frames of the states of the given transitions as array (len(indices), historyLength), the oldest frame first
+	def getStackIndices(self, indices):
+		ages = (self.position - 1 - indices) % self.capacity # 0 for the newest transition
+		stack = (indices[:, None] + np.arange(1 - self.historyLength, 1)) % self.capacity
+		cut = np.zeros(len(indices), dtype=bool) # the episode started after this frame
+		for k in range(self.historyLength - 2, -1, -1):
+			older, newer = stack[:, k], stack[:, k + 1]
+			cut |= (ages + self.historyLength - 1 - k >= self.count) | self.done[older] | (self.worldCounts[older] != self.worldCounts[newer])
+			stack[:, k] = np.where(cut, newer, older)
+		return stack
+
+	# returns an array for the sampled frames, reused by every call with the same name and size
+	def getBuffer(self, name, size):
+		shape = (size, self.historyLength) + self.frameShape
+		if (name not in self.buffers) or (self.buffers[name].shape != shape):
+			self.buffers[name] = np.empty(shape, dtype=np.uint8)
+		return self.buffers[name]
+
+	# returns a minibatch (Batch), prioritized or uniform
+	# beta: how much the importance sampling weights correct the prioritized sampling (0: not at all, 1: fully)
+	# states and nextStates of the returned batch are overwritten by the next call
+	def sample(self, batchSize, prioritized=True, beta=0.4):
+		if self.priorities.getTotal() <= 0:
+			raise ValueError("The replay memory has no transitions to sample yet!")
+		if prioritized:
+			total = self.priorities.getTotal()
+			values = (np.arange(batchSize) + self.random.random_sample(batchSize)) * (total / batchSize) # one value per stratum
+			indices = self.priorities.find(values)
+			weights = (self.count * self.priorities.get(indices) / total) ** -beta
+			weights = (weights / weights.max()).astype(np.float32)
+		else:
+			# transitions with priority 0 can't be sampled (the newest one and the last ones of episodes ending without done), they are drawn again
+			indices = (self.position - 1 - self.random.randint(0, self.count, batchSize)) % self.capacity
+			invalid = self.priorities.get(indices) <= 0
+			while invalid.any():
+				indices[invalid] = (self.position - 1 - self.random.randint(0, self.count, np.count_nonzero(invalid))) % self.capacity
+				invalid = self.priorities.get(indices) <= 0
+			weights = np.ones(batchSize, dtype=np.float32)
+		states = self.getBuffer("states", batchSize)
+		nextStates = self.getBuffer("nextStates", batchSize)
+		# mode "wrap" lets np.take write into the buffers directly (the indices are valid anyway)
+		np.take(self.frames, self.getStackIndices(indices), axis=0, out=states, mode="wrap")
+		np.take(self.frames, self.getStackIndices((indices + 1) % self.capacity), axis=0, out=nextStates, mode="wrap")
+		return Batch(indices, states, self.actions[indices], self.rewards[indices], nextStates, self.done[indices], self.worldCounts[indices], weights)
+
+	# sets the priorities of sampled transitions from their errors (e.g. the TD errors)
+	def update(self, indices, errors):
+		priorities = (np.abs(errors) + PRIORITY_EPSILON) ** self.alpha
+		self.maxPriority = max(self.maxPriority, float(priorities.max()))
+		self.priorities.update(indices, priorities)
+
+	# writes the changes to the files
+	def flush(self):
+		for array in (self.frames, self.actions, self.rewards, self.done, self.worldCounts, self.priorities.tree):
+			array.flush()
+		meta = {"version": VERSION, "capacity": self.capacity, "frameShape": list(self.frameShape), "historyLength": self.historyLength,
+			"position": self.position, "count": self.count, "maxPriority": self.maxPriority}
+		metaPath = os.path.join(self.directory, META_FILE)
+		f = open(metaPath + ".tmp", "w")
+		json.dump(meta, f)
+		f.close()
+		os.replace(metaPath + ".tmp", metaPath)
+
+	def close(self):
+		self.flush()
+		self.frames = self.actions = self.rewards = self.done = self.worldCounts = self.priorities = None
+
+
+# returns the disk space used by the files in the directory in bytes (the array files are sparse)
+def getDiskUsage(directory):
+	return sum(os.stat(os.path.join(directory, name)).st_blocks * 512 for name in os.listdir(directory))
+
+
+# main
+# fills a replay memory with random frames and measures adding and sampling
+# arguments: directory, optional: number of transitions to add, capacity
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python replayMemory.py <directory> [<transitions> [<capacity>]]")
+		sys.exit(1)
+	transitions = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+	capacity = int(sys.argv[3]) if len(sys.argv) > 3 else 1000000
+	memory = ReplayMemory(sys.argv[1], capacity, seed=0)
+	frames = np.random.RandomState(0).randint(0, 256, (256,) + memory.frameShape).astype(np.uint8)
+	start = time.time()
+	for i in range(transitions):
+		memory.add(frames[i % len(frames)], i % 4, 1.0, i % 500 == 499, i // 500)
+	duration = time.time() - start
+	print("{} transitions added in {:.2f}s ({:.0f} per second), {} stored".format(transitions, duration, transitions / duration, memory.count))
+	for prioritized in (False, True):
+		start = time.time()
+		for _ in range(100):
+			batch = memory.sample(32, prioritized)
+			memory.update(batch.indices, np.random.random_sample(32))
+		print("{} sampling: {:.2f}ms per batch of 32".format("prioritized" if prioritized else "uniform", (time.time() - start) * 10))
+	memory.close()
+	print("{:.1f} MB on disk".format(getDiskUsage(sys.argv[1]) / 1e6))
@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+import random
+import importlib.util
+from collections import namedtuple
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+
+from simulation import Simulation, readPaths, flagsToBits, FLAG_HIT_GOAL
+
+
+# one step of one game as streamed from the workers to the parent process
+# params are the parameters the agent got before choosing the action, flags are given as bitmask (see simulation.FLAG_*)
+Transition = namedtuple('Transition', ['worker', 'worldname', 'params', 'action', 'flags', 'score'])
+
+# message sent from the parent to tell a worker to stop
+MESSAGE_STOP = "stop"
+
+# size (width, height, channels) of the screenshots rendered for the agents (same as game.SCREENSHOT_CURRENT_SIZE)
+SCREENSHOT_SIZE = (256, 213, 3)
+SCREENSHOT_NAME = "current.png"
+OBSERVATION_CHANNEL_NAME = "observation.channel"
+# screen resolution of the game (same as game.SCREEN_RESOLUTION), decides how many blocks are visible
+SCREEN_RESOLUTION = (768, 640)
+
+
+# loads an AIConnector module (e.g. AIConnector.py or the random agent) from the given file
+def loadConnector(path):
+	spec = importlib.util.spec_from_file_location("AIConnector", path)
+	connector = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(connector)
+	return connector
+
+
+# renders the screenshots of a headless game for agents that read the screen (e.g. the Lua DQN) and hands them over
+# through an observation channel (see observationChannel.py), or saves them as png file if png is set (slow, e.g. for debugging)
+# the screen is the same as in game.py, but rendered directly in the screenshot size (see observationRenderer.py)
+class ScreenshotWriter:
+
+	def __init__(self, path, size=SCREENSHOT_SIZE, png=False):
+		from observationRenderer import ObservationRenderer
+		self.path = path
+		self.size = tuple(size)
+		self.renderer = ObservationRenderer(self.size[:2], self.size[2])
+		self.channel = None
+		if not png:
+			from observationChannel import ObservationWriter
+			self.channel = ObservationWriter(path, (self.size[1], self.size[0], self.size[2]))
+		self.numbers = None
+		if os.path.isdir(r"gfx/numbers/"):
+			import pygame as pg
+			self.numbers = [pg.image.load(r"gfx/numbers/{}.png".format(i)) for i in range(10)]
+		self.world = None # world the tiles have been set for
+
+	# writes the screenshot of the current frame of the game (simulation.Simulation)
+	def write(self, sim):
+		import pygame as pg
+		from tileCache import loadLevelTiles
+		if sim.world is not self.world: # new level
+			self.world = sim.world
+			self.screenSizeBlocks = (int(SCREEN_RESOLUTION[0] / sim.variables['blocksize']), int(SCREEN_RESOLUTION[1] / sim.variables['blocksize']))
+			self.renderer.setScreenSizeBlocks(self.screenSizeBlocks)
+			self.renderer.setTiles(loadLevelTiles(sim.blocks, sim.blockgfx), sim.blocks, self.numbers)
+		# world offset as in game.computeWorldOffset
+		x_offset = int(max(0, min(sim.world.width - self.screenSizeBlocks[0], sim.playerpos[0] - int(self.screenSizeBlocks[0] / 2))))
+		y_offset = int(max(0, min(sim.world.height - self.screenSizeBlocks[1], sim.playerpos[1] - int(self.screenSizeBlocks[1] / 2))))
+		frame = self.renderer.render(sim.world, sim.playerpos, x_offset, y_offset, sim.score, sim.variables['score_position'] if 'score_position' in sim.variables else -1)
+		if self.channel:
+			self.channel.write(frame)
+		else:
+			pg.image.save(pg.image.frombuffer(frame.repeat(3 // frame.shape[2], axis=2).tobytes(), self.size[:2], "RGB"), self.path)
+
+	def close(self):
+		if self.channel:
+			self.channel.close()
+
+
+# main function of a worker process
+# plays the game headlessly with the given agent, the same way game.py does it in AI mode
+# transitions are sent in lists of batchSize elements through conn, None is sent when the worker is finished
+# if screenshotSize is given, the screen is rendered every frame into the worker's observation channel (or screenshot file, if png is set),
+# otherwise the agent only gets the parameters
+def runWorker(workerId, conn, connectorPath, levelDir, levelPattern, screenshotDirectory, seed, maxFrames, batchSize, screenshotSize, png):
+	random.seed(seed)
+	connector = loadConnector(connectorPath)
+	screenshots = None
+	if screenshotSize:
+		# every worker gets its own screenshot directory
+		screenshotDirectory = os.path.join(screenshotDirectory, "worker{}".format(workerId), "")
+		if not os.path.exists(screenshotDirectory):
+			os.makedirs(screenshotDirectory)
+		if png:
+			screenshots = ScreenshotWriter(screenshotDirectory + SCREENSHOT_NAME, screenshotSize, True)
+			connector.setScreenshotPath(screenshots.path)
+		else:
+			screenshots = ScreenshotWriter(screenshotDirectory + OBSERVATION_CHANNEL_NAME, screenshotSize)
+			connector.setObservationChannelPath(screenshots.path)
+
+	sim = Simulation(levelDir, levelPattern, seed=seed)
+	sim.reset()
+	connector.increaseWorldCount()
+	batch = list()
+	reload = connector.getReload()
+	actionCount = connector.getActionCount()
+	while True:
+		# check wether a new level was requested by the AI
+		if reload:
+			sim.reset()
+			connector.increaseWorldCount()
+		# check if maximum amount of frames is reached
+		if 0 < maxFrames < actionCount:
+			break
+		params = sim.getParams()
+		if screenshots:
+			screenshots.write(sim)
+		action, reload, actionCount = connector.step(params)
+		_, flags, score = sim.step(action)
+		batch.append(Transition(workerId, sim.worldname, params, action, flagsToBits(flags), score))
+		if sim.done: # load random new level
+			sim.reset()
+			connector.increaseWorldCount()
+		if len(batch) >= batchSize:
+			conn.send(batch)
+			batch = list()
+			if conn.poll() and conn.recv() == MESSAGE_STOP:
+				break
+	if batch:
+		conn.send(batch)
+	conn.send(None)
+	connector.cleanup()
+	if screenshots:
+		screenshots.close()
+	conn.close()
+
+
+'''
+Plays the game in several worker processes at once, each one with its own headless game (see simulation.py) and its own agent.
+The agent is any module with the interface of AIConnector.py (e.g. the random agent from "Experiment Files/random").
+Usage:
+	runner = RolloutRunner(4, "AIConnector.py", "paths.txt", seed=42)
+	runner.start()
+	for transition in runner.transitions():
+		...
+	runner.stop()
+levels can be a list with one (level directory, level pattern) tuple per worker, otherwise all workers use the levels from the paths file.
+Worker k is seeded with seed + k, maxFrames is the number of actions per worker after which it stops (0 for never).
+Every worker renders its screen into its own observation channel (<screenshot directory>/worker<k>/observation.channel, see observationChannel.py),
+so agents that read the screen work as in game.py with OBSERVATION_CHANNEL_PATH. With png=True, the screen is saved as png file instead
+(<screenshot directory>/worker<k>/current.png), which is much slower and only meant for debugging.
+Agents that only use the parameters (e.g. the random agent) can run without a screen (screenshotSize=None), which is the fastest.
+'''
+class RolloutRunner:
+
+	def __init__(self, workerCount, connectorPath="AIConnector.py", pathsFile="paths.txt", levels=None, seed=0, maxFrames=0, batchSize=64, screenshotSize=SCREENSHOT_SIZE, png=False):
+		levelDir, levelPattern, _, screenshotDirectory = readPaths(pathsFile)
+		self.workerCount = workerCount
+		self.connectorPath = connectorPath
+		self.levels = levels if levels is not None else [(levelDir, levelPattern)] * workerCount
+		self.screenshotDirectory = screenshotDirectory
+		self.seed = seed
+		self.maxFrames = maxFrames
+		self.batchSize = batchSize
+		self.screenshotSize = screenshotSize
+		self.png = png
+		self.processes = list()
+		self.connections = list()
+
+	# starts the worker processes
+	def start(self):
+		for k in range(self.workerCount):
+			parentConn, childConn = Pipe()
+			levelDir, levelPattern = self.levels[k]
+			p = Process(target=runWorker, args=(k, childConn, self.connectorPath, levelDir, levelPattern, self.screenshotDirectory, self.seed + k, self.maxFrames, self.batchSize, self.screenshotSize, self.png))
+			p.daemon = True
+			p.start()
+			childConn.close()
+			self.processes.append(p)
+			self.connections.append(parentConn)
+
+	# yields the transitions of all workers as they arrive, until all workers are finished
+	def transitions(self):
+		for batch in self.batches():
+			for transition in batch:
+				yield transition
+
+	# yields the transitions of all workers in the batches they were sent in, until all workers are finished
+	def batches(self):
+		running = list(self.connections)
+		while running:
+			for conn in wait(running):
+				try:
+					batch = conn.recv()
+				except EOFError: # worker died
+					batch = None
+				if batch is None:
+					running.remove(conn)
+				else:
+					yield batch
+
+	# tells all workers to stop and waits for them
+	def stop(self):
+		for conn in self.connections:
+			try:
+				conn.send(MESSAGE_STOP)
+			except OSError: # worker already finished
+				pass
+		for conn in self.connections:
+			try:
+				while conn.recv() is not None: # discard the remaining transitions
+					pass
+			except (EOFError, OSError): # worker already finished
+				pass
+			conn.close()
+		for p in self.processes:
+			p.join()
+		self.processes = list()
+		self.connections = list()
+
+
+# main
+# arguments (all optional): number of workers, path to the AIConnector module, paths file, frames per worker,
+# "noscreen" for agents that only use the parameters or "png" to save the screens as png files
+if __name__ == "__main__":
+	workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+	connectorPath = sys.argv[2] if len(sys.argv) > 2 else "AIConnector.py"
+	pathsFile = sys.argv[3] if len(sys.argv) > 3 else "paths.txt"
+	frames = int(sys.argv[4]) if len(sys.argv) > 4 else 10000
+	screen = sys.argv[5] if len(sys.argv) > 5 else None
+	screenshotSize = None if screen == "noscreen" else SCREENSHOT_SIZE
+	runner = RolloutRunner(workers, connectorPath, pathsFile, maxFrames=frames, screenshotSize=screenshotSize, png=screen == "png")
+	start = time.time()
+	runner.start()
+	count = 0
+	goals = 0
+	for batch in runner.batches():
+		count += len(batch)
+		goals += sum(1 for t in batch if t.flags & FLAG_HIT_GOAL)
+	duration = time.time() - start
+	runner.stop()
+	print("{} workers: {} transitions in {:.2f}s ({:.0f} per second), {} levels beaten".format(workers, count, duration, count / duration, goals))
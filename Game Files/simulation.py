@@ -0,0 +1,465 @@
+import random
+from collections import namedtuple
+
+from worldSaver import PACK_EXTENSION
+from utils import convertToNumberIfPossible
+from worldGrid import BLOCK_OUTSIDE
+from levelCache import loadLevel, listLevels
+
+
+# constants - action ids
+ACTION_NO_ACTION = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_JUMP = 3
+
+# constants - movement flags as bits (for passing flags around as a single number)
+FLAG_ON_GROUND = 1
+FLAG_NOT_MOVED = 2
+FLAG_HIT_ENEMY = 4
+FLAG_HIT_COIN = 8
+FLAG_HIT_GOAL = 16
+FLAG_FALL = 32
+FLAG_NAMES = {FLAG_ON_GROUND: 'on_ground', FLAG_NOT_MOVED: 'not_moved', FLAG_HIT_ENEMY: 'hit_enemy', FLAG_HIT_COIN: 'hit_coin', FLAG_HIT_GOAL: 'hit_goal', FLAG_FALL: 'fall'}
+FLAG_BITS = {v: k for k, v in FLAG_NAMES.items()}
+
+# constants - misc
+POSITION_HISTORY_LENGTH = 10 # length of the x position history
+
+# dynamic state of a Simulation (see Simulation.snapshot), the level itself is only referenced
+# removedCoins is the frozenset of the (x, y) positions of the coins collected in the level
+SimulationState = namedtuple('SimulationState', ['world', 'removedCoins', 'playerpos', 'positionXHistory', 'jumping', 'jumpingPhase', 'score', 'scoreDelta', 'done',
+	'frameCounter', 'deathCount', 'levelCount', 'coinCount', 'movesCount'])
+
+
+# reads the paths file (see README)
+# returns level directory, level pattern, statistics file name and screenshot directory
+def readPaths(path):
+	pf = open(path, 'r')
+	paths = [line[:-1] for line in pf]
+	pf.close()
+	return paths[0], paths[1], paths[2], paths[3]
+
+
+# returns the sorted names of the worldfiles matching the pattern in the given directory or level pack (see levelPack.py)
+def listWorlds(worlddir, pattern):
+	if worlddir.rstrip("/\\").endswith(PACK_EXTENSION):
+		from levelPack import openPack
+		return openPack(worlddir.rstrip("/\\")).match(pattern)
+	return listLevels(worlddir, pattern) # only listed again if the directory has changed (see levelCache.py)
+
+
+# chooses a random worldfile matching the pattern from the given directory
+# (or level pack: the worlddir is the pack file followed by a slash, e.g. "levels/training.pack/")
+# rng is the random.Random instance to use (default: the random module)
+def chooseWorld(worlddir, pattern, rng=None):
+	rng = rng if rng is not None else random
+	return worlddir + rng.choice(listWorlds(worlddir, pattern))
+
+
+# chooses the worldfile of an episode, which only depends on the seed of the episode (and the matching files)
+def chooseEpisodeWorld(worlddir, pattern, episodeSeed):
+	return chooseWorld(worlddir, pattern, random.Random(episodeSeed))
+
+
+# returns a new random seed for a run
+def createSeed():
+	return random.SystemRandom().getrandbits(32)
+
+
+# converts a set of movement flags into a bitmask
+def flagsToBits(flags):
+	bits = 0
+	for flag in flags:
+		bits |= FLAG_BITS[flag]
+	return bits
+
+
+# converts a bitmask into the set of movement flags
+def flagsToSet(bits):
+	return {name for bit, name in FLAG_NAMES.items() if bits & bit}
+
+
+# sets default values for all variables that are needed by the game, but not specified in the world file
+def setDefaultVariables(variables):
+	variables.setdefault('blocksize', 32)
+	variables.setdefault('jump_height', 3) # how many blocks the character will ascend when jumping
+	variables.setdefault('jump_width', 3) # for how many ticks the character will be "hovering" at the highest point of the jump - the maximum distance he can jump is actually higher
+	variables.setdefault('jump', 1) # how often character is able to jump before he has to touch ground again
+	variables.setdefault('coin_worth', 5) # how many points one coin gives
+	variables.setdefault('death_worth', -10) # how many points the character will lose if he dies
+	variables.setdefault('goal_worth', 100) # how many points the player will get if he reaches the goal
+	return variables
+
+
+# returns the spawn and goal position of the given world (x coordinate first)
+def findSpawnAndGoal(world, blocks):
+	spawnpos = None
+	goalpos = None
+	for y in range(len(world)):
+		for x in range(len(world[y])):
+			if world[y][x] == blocks['SPAWN']:
+				spawnpos = (x, y)
+			elif world[y][x] == blocks['GOAL']:
+				goalpos = (x, y)
+		if (spawnpos is not None) and (goalpos is not None): break
+	return spawnpos, goalpos
+
+
+# auxiliary method - returns block at given position or None if outside of world
+def getBlockAt(world, coord):
+	return world.getBlockAt(coord[0], coord[1])
+
+
+# computes the next position of the player
+# also handles gravity and collision detection
+# world is a WorldGrid, all blocks around the player are looked up directly in its cells (the border marks the outside of the world)
+# returns the new position and a set of flags (events triggered by the movement, e.g. contact with an enemy)
+def movePlayer(world, blocks, playerpos, direction, jumpingPhase):
+	movementFlags = set()
+	cells = world.cells
+	stride = world.stride
+	ground = blocks['GROUND']
+	x, y = playerpos
+	i = (y + 1) * stride + x + 1 # index of the player position in cells
+	# move player up/down
+	if jumpingPhase == 0: # apply gravity
+		block = cells[i + stride] # get block below player
+		if block == BLOCK_OUTSIDE:
+			movementFlags.add('fall')
+			return playerpos, movementFlags # player fell off the world
+		elif block != ground: # player will fall
+			y += 1
+			i += stride
+	elif jumpingPhase > 0: # player is ascending
+		block = cells[i - stride] # get block above player
+		if (block != BLOCK_OUTSIDE) and (block != ground): # no obstacle above
+			y -= 1
+			i -= stride
+	# elif jumpingPhase < 0: nothing to do here, player is "hovering" and will move neither up nor down
+
+	# move player left/right
+	block = cells[i + direction]
+	if (block == BLOCK_OUTSIDE) or (block == ground): # collision detection
+		movementFlags.add('not_moved')
+	else:
+		x += direction
+		i += direction
+
+	# check current block / fill flaglist
+	if cells[i + stride] == ground:
+		movementFlags.add('on_ground') # player is on ground
+	block = cells[i] # block where player is
+	if block == blocks['ENEMY']:
+		movementFlags.add('hit_enemy')
+	elif block == blocks['COIN']:
+		movementFlags.add('hit_coin')
+	elif block == blocks['GOAL']:
+		movementFlags.add('hit_goal')
+
+	return (x, y), movementFlags
+
+
+# applies the given action to the jumping state
+# returns the horizontal movement direction and the new jumping state
+def applyAction(action, jumping, jumpingPhase, variables):
+	move = 0
+	if action == ACTION_RIGHT:
+		move = 1
+	elif action == ACTION_LEFT:
+		move = -1
+	elif action == ACTION_JUMP:
+		if jumping < variables['jump']: # character can still jump
+			jumping += 1
+			jumpingPhase = variables['jump_height']
+	return move, jumping, jumpingPhase
+
+
+# advances the jumping phase by one tick (see game.py for how jumping works)
+def updateJumpingPhase(jumpingPhase, variables):
+	if (jumpingPhase > 1) or (jumpingPhase < 0):
+		jumpingPhase -= 1
+	elif jumpingPhase == 1:
+		jumpingPhase = -1
+	if jumpingPhase < (-1) * variables['jump_width']: # end of hovering
+		jumpingPhase = 0
+	return jumpingPhase
+
+
+# computes the player state after one tick with the same rules as Simulation.tick (without score and coin removal)
+# state is (x, y, jumpingPhase, jumping), world has to contain all coins
+# returns the next state, the movement flags as bitmask and the x position before a respawn (for the position history)
+def computeTransition(world, blocks, variables, spawnpos, state, action):
+	x, y, jumpingPhase, jumping = state
+	move, jumping, jumpingPhase = applyAction(action, jumping, jumpingPhase, variables)
+	playerpos, movementFlags = movePlayer(world, blocks, (x, y), move, jumpingPhase)
+	jumpingPhase = updateJumpingPhase(jumpingPhase, variables)
+	bits = flagsToBits(movementFlags)
+	movedX = playerpos[0]
+	if bits & (FLAG_FALL | FLAG_HIT_ENEMY): # respawn
+		playerpos = spawnpos
+	elif bits & FLAG_HIT_GOAL:
+		jumping = 0
+		jumpingPhase = 0
+	if bits & FLAG_ON_GROUND:
+		jumping = 0
+		jumpingPhase = 0
+	return (playerpos[0], playerpos[1], jumpingPhase, jumping), bits, movedX
+
+
+'''
+Headless version of the game.
+Owns the complete game state and applies the same rules as the main loop in game.py, but never touches pygame.
+Usage:
+	sim = Simulation(r"levels/", r"training_*.txt")
+	sim.reset() # or sim.reset(path) for a specific level
+	observation, flags, score = sim.step(ACTION_RIGHT)
+If 'hit_goal' is contained in the returned flags, the level is beaten and reset() should be called to load the next one.
+With actionRepeat k, step() applies the action for k ticks (less, if the goal is reached before), the returned flags are the union of the flags
+of all ticks and the observation contains the score change over all ticks as "scoreDelta".
+Levels are chosen with a seed per episode (episodeSeed), which is taken from a random number generator seeded with seed (random, if None).
+If symbolicWindow is given as (width, height), the observation additionally contains the block ids around the player as "symbolic"
+(see symbolicObservation.py, additional requirement: the numpy library).
+snapshot() returns the dynamic state, which can be restored with restore() any number of times, e.g. for planning or tree search:
+	state = sim.snapshot()
+	sim.step(ACTION_JUMP) # try something
+	sim.restore(state)
+With compiled=True, the transitions of all player states are computed when a level is loaded and every tick is a lookup in that table
+(see transitionTable.py, additional requirement: the numpy library).
+With useDistanceMap=True, the distances to the goal of all player states are loaded when a level is loaded (see distanceMap.py)
+and the parameters contain the number of ticks the goal is away (distanceToGoal, -1 if it can't be reached).
+The world is kept as WorldGrid, loading the same level again only resets it instead of reading the file.
+Other levels are only read once per process, too (see levelCache.py), loading them again copies their blocks.
+The level is not copied for snapshots: collected coins are removed from the world in place, but also recorded in an immutable set,
+so a snapshot only keeps a reference to that set and restore() only changes the blocks that differ.
+'''
+class Simulation:
+
+	def __init__(self, levelDir=None, levelPattern=None, symbolicWindow=None, actionRepeat=1, seed=None, compiled=False, useDistanceMap=False):
+		self.levelDir = levelDir # directory to choose levels from if reset() is called without a level
+		self.levelPattern = levelPattern # pattern for the level files in levelDir
+		self.seed = seed if seed is not None else createSeed()
+		self.random = random.Random(self.seed) # gives the seeds of the episodes
+		self.episodeSeed = None # seed of the current episode
+		self.actionRepeat = actionRepeat # how many ticks each action is applied
+		self.scoreDelta = 0 # score change during the last step
+		self.symbolicObserver = None
+		if symbolicWindow:
+			from symbolicObservation import SymbolicObserver
+			self.symbolicObserver = SymbolicObserver(symbolicWindow)
+		self.compiled = compiled
+		self.transitionTable = None # transition table of the current level (only if compiled)
+		self.useDistanceMap = useDistanceMap
+		self.distanceMap = None # distances to the goal in the current level (only if useDistanceMap)
+		self.worldname = None
+		self.variables = None
+		self.blocks = None
+		self.blockgfx = None
+		self.world = None
+		self.removedCoins = frozenset() # positions of the coins collected in the current level
+		self.spawnpos = None
+		self.goalpos = None
+		self.playerpos = None
+		self.positionXHistory = list()
+		self.jumping = 0
+		self.jumpingPhase = 0
+		self.score = 0
+		self.done = False # True after the goal has been reached
+		self.frameCounter = 0 # total number of steps, not reset with the level
+		self.resetCounters()
+
+	# resets the per-level statistics (same as the statistics in game.py)
+	def resetCounters(self):
+		self.deathCount = 0
+		self.levelCount = 0
+		self.coinCount = 0
+		self.movesCount = [0, 0, 0, 0]
+
+	# loads the given level or a random one from levelDir, if no level is given
+	# episodeSeed is the seed of the episode, a new one is drawn if not given
+	# returns the first observation
+	def reset(self, level=None, episodeSeed=None):
+		self.episodeSeed = episodeSeed if episodeSeed is not None else self.random.getrandbits(32)
+		if level is None:
+			level = chooseEpisodeWorld(self.levelDir, self.levelPattern, self.episodeSeed)
+		if (level == self.worldname) and (self.world is not None): # same level again, no need to load the file
+			self.world.reset()
+		else:
+			cached = loadLevel(level) # only loaded once per process (see levelCache.py)
+			info, self.blocks, self.blockgfx = cached.info, cached.blocks, cached.blockgfx
+			self.world = cached.createWorld()
+			self.variables = setDefaultVariables({k: convertToNumberIfPossible(v) for k, v in info.items()})
+			if self.compiled:
+				from transitionTable import TransitionTable
+				self.transitionTable = TransitionTable(self.world, self.blocks, self.variables)
+			if self.useDistanceMap:
+				from distanceMap import loadDistanceMap
+				self.distanceMap = loadDistanceMap(level, self.world, self.blocks, self.variables)
+		self.removedCoins = frozenset()
+		self.worldname = level
+		self.spawnpos, self.goalpos = self.world.spawnpos, self.world.goalpos
+		if self.symbolicObserver:
+			self.symbolicObserver.setWorld(self.world, self.blocks)
+		self.playerpos = self.spawnpos
+		self.positionXHistory = [self.playerpos[0]]
+		self.jumping = 0
+		self.jumpingPhase = 0
+		self.score = self.variables['starting_score'] if 'starting_score' in self.variables else 0
+		self.done = False
+		self.scoreDelta = 0
+		self.resetCounters()
+		return self.getObservation()
+
+	# applies the action for actionRepeat ticks or until the goal is reached
+	# returns the observation, the movement flags of all ticks and the score after the step
+	def step(self, action):
+		scoreBefore = self.score
+		movementFlags = set()
+		for _ in range(self.actionRepeat):
+			movementFlags |= self.tick(action)
+			if self.done:
+				break
+		self.scoreDelta = self.score - scoreBefore
+		return self.getObservation(), movementFlags, self.score
+
+	# advances the game by one frame
+	# returns the movement flags
+	def tick(self, action):
+		if self.transitionTable is not None:
+			return self.tickCompiled(action)
+		self.frameCounter += 1
+		move, self.jumping, self.jumpingPhase = applyAction(action, self.jumping, self.jumpingPhase, self.variables)
+		self.movesCount[action] += 1
+
+		# update player movement
+		self.playerpos, movementFlags = movePlayer(self.world, self.blocks, self.playerpos, move, self.jumpingPhase)
+		if 'fall' not in movementFlags: # the position history is not updated if the player fell out of the world
+			self.positionXHistory.append(self.playerpos[0])
+			if len(self.positionXHistory) > POSITION_HISTORY_LENGTH:
+				self.positionXHistory.pop(0)
+
+		# update jumping state
+		self.jumpingPhase = updateJumpingPhase(self.jumpingPhase, self.variables)
+
+		# interprete movementFlags
+		if ('fall' in movementFlags) or ('hit_enemy' in movementFlags): # apply death penalty and respawn player
+			self.modifyScore(self.variables['death_worth'])
+			self.deathCount += 1
+			self.playerpos = self.spawnpos
+		elif 'hit_coin' in movementFlags: # remove coin and grant points
+			self.setBlock(self.playerpos[0], self.playerpos[1], self.blocks['AIR'])
+			self.removedCoins = self.removedCoins | {self.playerpos}
+			self.modifyScore(self.variables['coin_worth'])
+			self.coinCount += 1
+		elif 'hit_goal' in movementFlags:
+			self.modifyScore(self.variables['goal_worth'])
+			self.levelCount += 1
+			self.jumping = 0
+			self.jumpingPhase = 0
+			self.done = True
+		if 'on_ground' in movementFlags: # update jumping
+			self.jumping = 0
+			self.jumpingPhase = 0
+
+		return movementFlags
+
+	# same as tick(), but the player state is looked up in the transition table
+	def tickCompiled(self, action):
+		table = self.transitionTable
+		self.frameCounter += 1
+		self.movesCount[action] += 1
+
+		# update player state
+		s = table.index[(self.playerpos[0], self.playerpos[1], self.jumpingPhase, self.jumping)]
+		bits = table.flagsList[s][action]
+		x, y, self.jumpingPhase, self.jumping = table.states[table.nextList[s][action]]
+		if not bits & FLAG_FALL: # the position history is not updated if the player fell out of the world
+			self.positionXHistory.append(table.movedXList[s][action])
+			if len(self.positionXHistory) > POSITION_HISTORY_LENGTH:
+				self.positionXHistory.pop(0)
+		self.playerpos = (x, y) # respawn after death is already part of the table
+
+		# interprete flags
+		if bits & (FLAG_FALL | FLAG_HIT_ENEMY): # apply death penalty
+			self.modifyScore(self.variables['death_worth'])
+			self.deathCount += 1
+		elif bits & FLAG_HIT_COIN:
+			if self.playerpos in self.removedCoins: # the table doesn't know about collected coins
+				bits &= ~FLAG_HIT_COIN
+			else: # remove coin and grant points
+				self.setBlock(x, y, self.blocks['AIR'])
+				self.removedCoins = self.removedCoins | {self.playerpos}
+				self.modifyScore(self.variables['coin_worth'])
+				self.coinCount += 1
+		elif bits & FLAG_HIT_GOAL:
+			self.modifyScore(self.variables['goal_worth'])
+			self.levelCount += 1
+			self.done = True
+
+		return set(flagsToSet(bits))
+
+	# modifies the score by the given amount
+	# lower bound: 0
+	def modifyScore(self, amount):
+		self.score = max(0, self.score + amount)
+
+	# sets the block at the given position of the current world
+	def setBlock(self, x, y, block):
+		self.world.set(x, y, block)
+		if self.symbolicObserver:
+			self.symbolicObserver.setBlock(x, y, block)
+
+	# returns the dynamic state of the game as SimulationState
+	def snapshot(self):
+		return SimulationState(self.world, self.removedCoins, self.playerpos, tuple(self.positionXHistory), self.jumping, self.jumpingPhase, self.score, self.scoreDelta, self.done,
+			self.frameCounter, self.deathCount, self.levelCount, self.coinCount, tuple(self.movesCount))
+
+	# restores a state returned by snapshot(), which has to be from the current level (raises ValueError otherwise)
+	def restore(self, state):
+		if state.world is not self.world:
+			raise ValueError("The state is from another level!")
+		# put back the coins collected after the snapshot and remove the ones collected before it, if they have been put back
+		for x, y in self.removedCoins - state.removedCoins:
+			self.setBlock(x, y, self.blocks['COIN'])
+		for x, y in state.removedCoins - self.removedCoins:
+			self.setBlock(x, y, self.blocks['AIR'])
+		self.removedCoins = state.removedCoins
+		self.playerpos = state.playerpos
+		self.positionXHistory = list(state.positionXHistory)
+		self.jumping = state.jumping
+		self.jumpingPhase = state.jumpingPhase
+		self.score = state.score
+		self.scoreDelta = state.scoreDelta
+		self.done = state.done
+		self.frameCounter = state.frameCounter
+		self.deathCount = state.deathCount
+		self.levelCount = state.levelCount
+		self.coinCount = state.coinCount
+		self.movesCount = list(state.movesCount)
+
+	# returns the current observation
+	def getObservation(self):
+		observation = self.getParams()
+		observation["scoreDelta"] = self.scoreDelta
+		if self.symbolicObserver:
+			observation["symbolic"] = self.getSymbolicObservation()
+		return observation
+
+	# returns the block ids in the window around the player as int8 array (see symbolicObservation.SymbolicObserver.observe)
+	def getSymbolicObservation(self, out=None):
+		return self.symbolicObserver.observe(self.playerpos, out)
+
+	# returns the parameters the AI gets in game.py
+	def getParams(self):
+		params = dict()
+		params["score"] = self.score
+		params["x"] = self.playerpos[0]
+		params["xDistanceToGoal"] = self.goalpos[0] - self.playerpos[0]
+		if self.distanceMap:
+			params["distanceToGoal"] = self.distanceMap.get(self.playerpos[0], self.playerpos[1], self.jumpingPhase, self.jumping)
+		params["deathCount"] = self.deathCount
+		params["levelBeatenCount"] = self.levelCount
+		params["worldname"] = self.worldname
+		history = self.positionXHistory
+		params["historyMoveSum"] = (sum(map(lambda x, y: x - y, history[1:], history[:-1])))/float(len(history)) if len(history) >= 5 else None
+		return params
@@ -0,0 +1,80 @@
+import numpy as np
+
+from batchSimulation import BLOCK_OUTSIDE, BLOCK_NAMES
+
+
+# default size (width, height) of the window around the player, odd so the player is in the middle
+DEFAULT_WINDOW = (15, 11)
+
+# channels of a symbolic observation
+CHANNEL_BLOCKS = 0 # block ids (see batchSimulation.BLOCK_*), BLOCK_OUTSIDE outside of the world
+CHANNEL_PLAYER = 1 # 1 where the player is, 0 everywhere else
+CHANNEL_COUNT = 2
+
+
+# returns a lookup table from the block ids of a level to the block ids of batchSimulation (index: level block id)
+def getBlockLookup(blocks):
+	lookup = np.full(max(blocks.values()) + 1, BLOCK_OUTSIDE, dtype=np.int8)
+	for i, name in enumerate(BLOCK_NAMES):
+		if name in blocks:
+			lookup[blocks[name]] = i
+	return lookup
+
+
+# returns an empty array for count symbolic observations of the given window size
+def createObservationArray(count, window=DEFAULT_WINDOW):
+	return np.zeros((count, CHANNEL_COUNT, window[1], window[0]), dtype=np.int8)
+
+
+# cuts the windows around the players out of the worlds
+# grid: worlds as int8 array (N, height + 2, width + 2) with a border of BLOCK_OUTSIDE (layout of batchSimulation.BatchSimulation)
+# x, y: player positions (without the border)
+# returns the observations as int8 array (N, CHANNEL_COUNT, window height, window width), written to out if given
+def extractWindows(grid, x, y, window=DEFAULT_WINDOW, out=None):
+	count, height, width = grid.shape
+	if out is None:
+		out = createObservationArray(count, window)
+	# grid positions of the window, positions outside of the grid are clipped to the border (which is BLOCK_OUTSIDE)
+	rows = np.clip(np.asarray(y)[:, None] + 1 + np.arange(window[1]) - window[1] // 2, 0, height - 1)
+	cols = np.clip(np.asarray(x)[:, None] + 1 + np.arange(window[0]) - window[0] // 2, 0, width - 1)
+	out[:, CHANNEL_BLOCKS] = grid[np.arange(count)[:, None, None], rows[:, :, None], cols[:, None, :]]
+	out[:, CHANNEL_PLAYER] = 0
+	out[:, CHANNEL_PLAYER, window[1] // 2, window[0] // 2] = 1
+	return out
+
+
+'''
+Symbolic observation of a single game: the block ids in a window around the player, without any rendering.
+The world is translated to the block ids of batchSimulation once per level (setWorld) and padded with BLOCK_OUTSIDE by half a window,
+so cutting out the window is a single slice. Changes of the world (collected coins) have to be passed to setBlock().
+'''
+class SymbolicObserver:
+
+	def __init__(self, window=DEFAULT_WINDOW):
+		self.window = tuple(window)
+		self.padX = self.window[0] // 2
+		self.padY = self.window[1] // 2
+		self.grid = None
+		self.lookup = None
+		self.player = np.zeros((self.window[1], self.window[0]), dtype=np.int8)
+		self.player[self.padY, self.padX] = 1
+
+	# sets the world (worldGrid.WorldGrid) and its block name -> id mapping
+	def setWorld(self, world, blocks):
+		self.lookup = getBlockLookup(blocks)
+		cells = np.frombuffer(world.cells, dtype=np.int8).reshape(world.height + 2, world.stride)[1:-1, 1:-1]
+		self.grid = np.full((world.height + 2 * self.padY, world.width + 2 * self.padX), BLOCK_OUTSIDE, dtype=np.int8)
+		self.grid[self.padY:self.padY + world.height, self.padX:self.padX + world.width] = np.where(cells == BLOCK_OUTSIDE, BLOCK_OUTSIDE, self.lookup[cells])
+
+	# sets the block at the given position (block id of the level)
+	def setBlock(self, x, y, block):
+		self.grid[y + self.padY, x + self.padX] = self.lookup[block]
+
+	# returns the observation for the given player position as int8 array (CHANNEL_COUNT, window height, window width)
+	def observe(self, playerpos, out=None):
+		if out is None:
+			out = np.empty((CHANNEL_COUNT, self.window[1], self.window[0]), dtype=np.int8)
+		x, y = playerpos
+		out[CHANNEL_BLOCKS] = self.grid[y:y + self.window[1], x:x + self.window[0]]
+		out[CHANNEL_PLAYER] = self.player
+		return out
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+import pygame as pg
+
+
+# converts a surface to the pixel format of the display (if there is one), keeping per pixel alpha
+def convertSurface(surface):
+	if pg.display.get_surface() is None:
+		return surface
+	if surface.get_flags() & pg.SRCALPHA:
+		return surface.convert_alpha()
+	return surface.convert()
+
+
+'''
+Cache for tile graphics, keyed by the path of the graphic file.
+Every file is loaded and converted to the display format only once. Tiles of the default size are packed into atlas pages
+(big surfaces, one kind for tiles with and one for tiles without per pixel alpha), the returned surfaces are subsurfaces of them.
+If more than maxTiles tiles are cached, the least recently used one is dropped and its place in the atlas is reused.
+So don't hold on to surfaces returned by get() longer than for the current level, maxTiles has to be bigger than the number of tiles per level.
+'''
+class TileCache:
+
+	# maxTiles: maximum number of cached tiles, tileSize: size of the tiles in the atlas, pageSize: number of tiles per page (x, y)
+	def __init__(self, maxTiles=256, tileSize=(32, 32), pageSize=(16, 16)):
+		self.maxTiles = maxTiles
+		self.tileSize = tuple(tileSize)
+		self.pageSize = tuple(pageSize)
+		self.tiles = OrderedDict() # path -> (surface, alpha, slot), least recently used first
+		self.pages = {True: list(), False: list()} # atlas pages with and without per pixel alpha
+		self.freeSlots = {True: list(), False: list()} # unused (page, rect) tuples
+		self.hits = 0
+		self.misses = 0
+
+	# returns the tile graphic from the given file
+	def get(self, path):
+		if path in self.tiles:
+			self.tiles.move_to_end(path)
+			self.hits += 1
+			return self.tiles[path][0]
+		self.misses += 1
+		image = convertSurface(pg.image.load(path))
+		while len(self.tiles) >= self.maxTiles:
+			self.evict()
+		alpha = bool(image.get_flags() & pg.SRCALPHA)
+		slot = None
+		surface = image
+		if image.get_size() == self.tileSize: # put into the atlas, other sizes are kept as they are
+			slot = self.allocate(alpha)
+			page, rect = slot
+			if alpha:
+				page.fill((0, 0, 0, 0), rect)
+				page.blit(image, rect, special_flags=pg.BLEND_RGBA_MAX) # copies the pixels including alpha instead of blending them
+			else:
+				page.blit(image, rect)
+			surface = page.subsurface(rect)
+		self.tiles[path] = (surface, alpha, slot)
+		return surface
+
+	# drops the least recently used tile
+	def evict(self):
+		_, (_, alpha, slot) = self.tiles.popitem(last=False)
+		if slot is not None:
+			self.freeSlots[alpha].append(slot)
+
+	# returns a free (page, rect) tuple in the atlas, adds a page if necessary
+	def allocate(self, alpha):
+		if not self.freeSlots[alpha]:
+			size = (self.tileSize[0] * self.pageSize[0], self.tileSize[1] * self.pageSize[1])
+			page = convertSurface(pg.Surface(size, pg.SRCALPHA, 32) if alpha else pg.Surface(size))
+			self.pages[alpha].append(page)
+			for y in reversed(range(self.pageSize[1])):
+				for x in reversed(range(self.pageSize[0])):
+					self.freeSlots[alpha].append((page, pg.Rect(x * self.tileSize[0], y * self.tileSize[1], self.tileSize[0], self.tileSize[1])))
+		return self.freeSlots[alpha].pop()
+
+
+# process-wide cache
+CACHE = TileCache()
+
+
+# returns the tile graphic from the given file using the process-wide cache
+def loadTile(path):
+	return CACHE.get(path)
+
+
+# returns the tile graphics of a level (block id -> surface, the player has id -1) as given in its blockgfx dict,
+# defaults to gfx/<BLOCKNAME>/primitive.png if a block isn't specified
+def loadLevelTiles(blocks, blockgfx):
+	gfx = dict()
+	for k, v in blocks.items():
+		gfx[v] = loadTile(blockgfx[v] if v in blockgfx else r"gfx/{}/primitive.png".format(k.lower()))
+	gfx[-1] = loadTile(blockgfx[-1] if -1 in blockgfx else r"gfx/player/primitive.png")
+	return gfx
@@ -0,0 +1,116 @@
+import sys
+import time
+import random
+from array import array
+from collections import deque
+
+import numpy as np
+
+from simulation import Simulation, computeTransition, ACTION_NO_ACTION, ACTION_JUMP
+
+
+'''
+Transition table of a level: the physics of the game only depend on the player state (x, y, jumpingPhase, jumping), the action and the level,
+so the next state and the movement flags of every state reachable from the spawn position are computed once when the level is loaded.
+A tick is then a single lookup, which also works for arrays of states and actions (many players at once):
+	table = TransitionTable(world, blocks, variables)
+	states = np.full(1000, table.startState)
+	states, flags = table.step(states, actions)
+States are numbered, table.states holds the (x, y, jumpingPhase, jumping) tuple of each number, table.index the other way round.
+The flags are bitmasks (see simulation.FLAG_*). Collected coins are not part of the state: FLAG_HIT_COIN is set whenever the player
+is on a position which had a coin in the loaded level, the caller has to ignore it if the coin is already gone (see Simulation.tickCompiled).
+Scores are not handled by the table either.
+'''
+class TransitionTable:
+
+	# world: worldGrid.WorldGrid of the level (its pristine blocks are used), blocks: block name -> id mapping, variables: level variables
+	def __init__(self, world, blocks, variables):
+		cells, world.cells = world.cells, array('b', world.pristine) # compute with all coins in place
+		try:
+			self.build(world, blocks, variables)
+		finally:
+			world.cells = cells
+
+	# finds all states reachable from the spawn position (breadth first) and computes their transitions
+	def build(self, world, blocks, variables):
+		self.states = [(world.spawnpos[0], world.spawnpos[1], 0, 0)]
+		self.index = {self.states[0]: 0}
+		self.startState = 0
+		nextStates = list()
+		flags = list()
+		movedX = list()
+		queue = deque([0])
+		while queue:
+			s = queue.popleft()
+			for action in range(ACTION_NO_ACTION, ACTION_JUMP + 1):
+				state, bits, x = computeTransition(world, blocks, variables, world.spawnpos, self.states[s], action)
+				if state not in self.index:
+					self.index[state] = len(self.states)
+					self.states.append(state)
+					queue.append(self.index[state])
+				nextStates.append((s, action, self.index[state]))
+				flags.append(bits)
+				movedX.append(x)
+		count = len(self.states)
+		self.next = np.zeros((count, ACTION_JUMP + 1), dtype=np.int32)
+		self.flags = np.zeros((count, ACTION_JUMP + 1), dtype=np.uint8)
+		self.movedX = np.zeros((count, ACTION_JUMP + 1), dtype=np.int32)
+		for (s, action, n), bits, x in zip(nextStates, flags, movedX):
+			self.next[s, action] = n
+			self.flags[s, action] = bits
+			self.movedX[s, action] = x
+		# lists for fast lookups of single states
+		self.nextList = self.next.tolist()
+		self.flagsList = self.flags.tolist()
+		self.movedXList = self.movedX.tolist()
+		# state components as arrays (index: state number)
+		self.x, self.y, self.jumpingPhase, self.jumping = (np.array(c, dtype=np.int32) for c in zip(*self.states))
+
+	# advances the given state number(s) by one tick with the given action(s)
+	# works with single numbers and with numpy arrays
+	# returns the next state number(s) and the movement flags as bitmask(s)
+	def step(self, states, actions):
+		return self.next[states, actions], self.flags[states, actions]
+
+
+# checks that the transition table gives the same results as the normal game rules
+# plays the level with random actions for the given number of ticks with a normal and a compiled Simulation
+# returns the number of ticks played, raises AssertionError if there is a difference
+def verifyTransitionTable(level, ticks=10000, seed=0):
+	rng = random.Random(seed)
+	sim = Simulation(seed=seed)
+	compiled = Simulation(seed=seed, compiled=True)
+	sim.reset(level)
+	compiled.reset(level)
+	for t in range(ticks):
+		action = rng.randint(ACTION_NO_ACTION, ACTION_JUMP)
+		flags = sim.tick(action)
+		compiledFlags = compiled.tick(action)
+		assert flags == compiledFlags, "tick {}: flags {} != {}".format(t, flags, compiledFlags)
+		assert compiled.snapshot()[1:] == sim.snapshot()[1:], "tick {}: state differs".format(t)
+		if sim.done:
+			sim.reset(level)
+			compiled.reset(level)
+	return ticks
+
+
+# main
+# verifies the transition tables of the given levels and measures the speed of vectorized steps
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python transitionTable.py <level> [<level> ...]")
+		sys.exit(1)
+	for level in sys.argv[1:]:
+		sim = Simulation(compiled=True)
+		start = time.time()
+		sim.reset(level)
+		buildTime = time.time() - start
+		verifyTransitionTable(level)
+		table = sim.transitionTable
+		states = np.full(1000000, table.startState, dtype=np.int32)
+		actions = np.random.randint(ACTION_NO_ACTION, ACTION_JUMP + 1, size=(10, states.size))
+		start = time.time()
+		for a in actions:
+			states, flags = table.step(states, a)
+		duration = time.time() - start
+		print("{}: {} states, built in {:.3f}s, equivalent, {:.0f} steps per second".format(level, len(table.states), buildTime, actions.size / duration))
@@ -222,12 +222,48 @@ function util.toImageDimensions(img, dimensions)
     return img
 end
 
+-- Reads a little endian unsigned integer with the given number of bytes from a ByteStorage (offset is 0-based).
+function util.readUInt(storage, offset, bytes)
+    local value = 0
+    for i=bytes,1,-1 do
+        value = value * 256 + storage[offset + i]
+    end
+    return value
+end
+
+-- Returns the newest screen from the observation channel as float tensor (channels x height x width) with values in [0, 1],
+-- same as image.load() would return it. The channel is a shared memory file written by the python game,
+-- see observationChannel.py for its layout.
+function util.readObservationChannel()
+    if OBSERVATION_CHANNEL == nil then
+        OBSERVATION_CHANNEL = torch.ByteStorage(OBSERVATION_CHANNEL_PATH, true) -- memory mapped, not copied
+    end
+    local s = OBSERVATION_CHANNEL
+    local slots = util.readUInt(s, 4, 4)
+    local height = util.readUInt(s, 8, 4)
+    local width = util.readUInt(s, 12, 4)
+    local channels = util.readUInt(s, 16, 4)
+    local sequence = util.readUInt(s, 20, 8)
+    local headerSize = 28
+    local slotSize = 8 + height * width * channels
+    local offset = headerSize + (sequence % slots) * slotSize + 8
+    local frame = torch.ByteTensor(s, offset + 1, torch.LongStorage({height, width, channels}))
+    return frame:permute(3, 1, 2):float():div(255)
+end
+
+-- Returns the current screen of the game as float tensor, either from the observation channel or from the screenshot file.
+function util.loadScreen()
+    if OBSERVATION_CHANNEL_PATH ~= nil then
+        return util.readObservationChannel()
+    end
+    return image.load(SCREENSHOT_FILEPATH, 3, "float")
+end
+
 -- Take a screenshot of the game and return it as a tensor.
 -- TODO no longer used?
 function util.getScreen()
-    local fp = SCREENSHOT_FILEPATH
     --gui.screenshot(fp) -- screenshot is taken from python game
-    local screen = image.load(fp, 3, "float"):clone()
+    local screen = util.loadScreen():clone()
     screen = image.scale(screen, IMG_DIMENSIONS[2], IMG_DIMENSIONS[3]):clone()
     if IMG_DIMENSIONS[1] == 1 then
         screen = util.rgb2y(screen)
@@ -237,15 +273,18 @@ end
 
 -- Take a screenshot of the game and return it jpg-compressed as a tensor.
 function util.getScreenCompressed()
-    local fp = SCREENSHOT_FILEPATH
     --gui.screenshot(fp) -- screenshot is taken from python game
-    return util.loadJPGCompressed(fp, IMG_DIMENSIONS[1], IMG_DIMENSIONS[2], IMG_DIMENSIONS[3])
+    return util.compressScreen(util.loadScreen(), IMG_DIMENSIONS[1], IMG_DIMENSIONS[2], IMG_DIMENSIONS[3])
 end
 
 -- Load a JPG image from a file, but keep it compressed.
 function util.loadJPGCompressed(fp, channels, height, width)
     -- from https://github.com/torch/image/blob/master/doc/saveload.md
-    local im = image.load(fp, 3, "float")
+    return util.compressScreen(image.load(fp, 3, "float"), channels, height, width)
+end
+
+-- Resize a screen tensor to the given dimensions and jpg-compress it.
+function util.compressScreen(im, channels, height, width)
     local c, h, w = im:size(1), im:size(2), im:size(3)
     --im = im[{{1,c}, {30,h}, {1,w}}] -- cut off 30px from the top
     if c ~= channels then
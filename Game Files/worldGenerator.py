@@ -203,7 +203,13 @@ def randomizeBlockGFX():
 	return tiles
 
 
-def generateManyWorlds(amount, naming_template, printWorld=False, randomizeParams=False, randomizeGFX=False):
+# generates amount levels and saves them as naming_template.format(i)
+# if packPath is given, the levels are written to this level pack instead (see levelPack.py), naming_template only gives their names then
+def generateManyWorlds(amount, naming_template, printWorld=False, randomizeParams=False, randomizeGFX=False, packPath=None):
+	pack = None
+	if packPath:
+		from levelPack import LevelPackWriter
+		pack = LevelPackWriter(packPath)
 	for i in range(amount):
 		resetVariables() # reset variables to default values
 		if randomizeParams:
@@ -215,7 +221,12 @@ def generateManyWorlds(amount, naming_template, printWorld=False, randomizeParam
 		if printWorld:
 			print(getWorldAsString(world))
 		variables = {'blocksize': BLOCK_SIZE, 'jump': JUMP, 'jump_height': JUMP_HEIGHT, 'jump_width': JUMP_WIDTH, 'score_position': SCORE_POSITION}
-		saveWorld(world, naming_template.format(i), BLOCKS_NAME_TO_ID, True, variables, tiles)
+		if pack:
+			pack.addWorld(naming_template.format(i), world, BLOCKS_NAME_TO_ID, variables, tiles)
+		else:
+			saveWorld(world, naming_template.format(i), BLOCKS_NAME_TO_ID, True, variables, tiles)
+	if pack:
+		pack.close()
 
 
 
@@ -0,0 +1,69 @@
+from array import array
+
+
+# block id of the border around the world (same as batchSimulation.BLOCK_OUTSIDE)
+BLOCK_OUTSIDE = -2
+
+
+'''
+The world of a level as one contiguous array of signed bytes (row-wise) with a border of BLOCK_OUTSIDE around it,
+so the blocks next to any position inside the world can be looked up without bounds checks.
+Position (x, y) is at index (y + 1) * stride + x + 1. Rows shorter than the longest one are filled up with BLOCK_OUTSIDE.
+The world as loaded is kept (pristine), so the level can be reset without loading the file again.
+'''
+class WorldGrid:
+
+	# world: list of rows of block ids (as in worldSaver.loadWorld), blocks: block name -> id mapping
+	def __init__(self, world, blocks):
+		self.height = len(world)
+		self.width = max(len(row) for row in world)
+		self.stride = self.width + 2
+		self.cells = array('b', [BLOCK_OUTSIDE]) * (self.stride * (self.height + 2))
+		for y, row in enumerate(world):
+			start = self.index(0, y)
+			self.cells[start:start + len(row)] = array('b', row)
+		self.pristine = array('b', self.cells)
+		self.spawnpos = self.find(blocks['SPAWN'])
+		self.goalpos = self.find(blocks['GOAL'])
+
+	# returns the index of the given position in cells
+	def index(self, x, y):
+		return (y + 1) * self.stride + x + 1
+
+	# returns the position of the first block with the given id or None if there is none
+	def find(self, block):
+		try:
+			i = self.pristine.index(block)
+		except ValueError:
+			return None
+		return (i % self.stride - 1, i // self.stride - 1)
+
+	# returns the block at the given position, which has to be inside the world or next to it (BLOCK_OUTSIDE there)
+	def get(self, x, y):
+		return self.cells[(y + 1) * self.stride + x + 1]
+
+	# sets the block at the given position, which has to be inside the world
+	def set(self, x, y, block):
+		self.cells[(y + 1) * self.stride + x + 1] = block
+
+	# returns the block at the given position or None if outside of the world (any position)
+	def getBlockAt(self, x, y):
+		if (x < 0) or (y < 0) or (x >= self.width) or (y >= self.height):
+			return None
+		block = self.cells[(y + 1) * self.stride + x + 1]
+		return None if block == BLOCK_OUTSIDE else block
+
+	# returns a new grid with the world as loaded (the pristine blocks are shared, they are never changed)
+	def copy(self):
+		grid = WorldGrid.__new__(WorldGrid)
+		grid.__dict__.update(self.__dict__)
+		grid.cells = array('b', self.pristine)
+		return grid
+
+	# restores the world as loaded
+	def reset(self):
+		self.cells[:] = self.pristine
+
+	# returns the world as list of rows of block ids (without the border)
+	def toLists(self):
+		return [[b for b in self.cells[self.index(0, y):self.index(self.width, y)] if b != BLOCK_OUTSIDE] for y in range(self.height)]
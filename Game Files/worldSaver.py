@@ -1,6 +1,53 @@
+import os
+import sys
+import json
+import struct
+from array import array
 from os.path import isfile, isdir
 
 
+# subdirectory of the level directory where data computed from the levels is cached (see getCachePath)
+CACHE_DIRECTORY = "__levelcache__"
+# file extension of level packs, levels in a pack have the path <pack file>/<level name> (see levelPack.py)
+PACK_EXTENSION = ".pack"
+USE_LEVEL_CACHE = True # False = loadWorld always parses the level file
+
+'''
+Compiled levels are stored as <level directory>/__levelcache__/<level file name>.lvl, so loadWorld doesn't need to parse the text again.
+File layout (all numbers little endian):
+	header: magic (4 bytes), version (uint16), modification time (nanoseconds) and size of the level file (uint64 each)
+	compiled level (see compileWorld, also used in level packs):
+		length of the meta data (uint32), number of rows (uint16)
+		meta data: info, blocks and blockgfx as json (utf-8)
+		row lengths: one uint16 per row
+		world: one int8 per block, row by row
+The compiled level is only used if modification time and size of the level file haven't changed.
+'''
+COMPILED_MAGIC = b"LVLC"
+COMPILED_VERSION = 1
+COMPILED_HEADER_FORMAT = "<4sHQQ"
+COMPILED_HEADER_SIZE = struct.calcsize(COMPILED_HEADER_FORMAT)
+COMPILED_LEVEL_FORMAT = "<IH"
+COMPILED_LEVEL_SIZE = struct.calcsize(COMPILED_LEVEL_FORMAT)
+COMPILED_EXTENSION = ".lvl"
+
+
+# returns the path of the file a level is stored in: the level file itself or the level pack that contains it
+def getLevelFile(levelPath):
+	directory = os.path.dirname(levelPath)
+	return directory if directory.endswith(PACK_EXTENSION) else levelPath
+
+
+# returns the path of a file in the cache directory for the given level file
+# (<level directory>/__levelcache__/<pack name>.<level name><extension> for levels in a level pack)
+def getCachePath(levelPath, extension):
+	directory, name = os.path.split(levelPath)
+	if directory.endswith(PACK_EXTENSION):
+		directory, pack = os.path.split(directory)
+		name = pack + "." + name
+	return os.path.join(directory, CACHE_DIRECTORY, name + extension)
+
+
 def getWorldAsString(world):
 	return '\n'.join([' '.join([str(x) for x in y]) for y in world])
 
@@ -27,7 +74,29 @@ def saveWorld(world, w_name, BLOCKS_NAME_TO_ID={'AIR':0, 'GROUND':1, 'ENEMY':2,
 
 
 
+# loads a level file, from the compiled level in the cache if possible (it is compiled when the file is parsed otherwise)
+# returns the info, the block name -> id mapping, the graphic files of the blocks and the world as list of rows
 def loadWorld(fileName):
+	if os.path.dirname(fileName).endswith(PACK_EXTENSION): # the level is in a level pack, which is compiled already
+		from levelPack import openPack
+		return openPack(os.path.dirname(fileName)).loadWorld(os.path.basename(fileName))
+	if not USE_LEVEL_CACHE:
+		return parseWorld(fileName)
+	stat = os.stat(fileName)
+	cachePath = getCachePath(fileName, COMPILED_EXTENSION)
+	level = loadCompiledWorld(cachePath, stat)
+	if level is None:
+		level = parseWorld(fileName)
+		try:
+			saveCompiledWorld(cachePath, level, stat)
+		except (IOError, OSError, OverflowError): # e.g. read-only level directory or blocks that don't fit in a byte, the file is just parsed every time
+			pass
+	return level
+
+
+
+# parses a level file (see loadWorld)
+def parseWorld(fileName):
 	wf = open(fileName, 'r')
 	mode = "null"
 	info = {}
@@ -57,6 +126,94 @@ def loadWorld(fileName):
 			world.append([int(z) for z in line.split(" ")])
 		else:
 			print("Could not interprete: mode={}, line={}\n".format(mode, line))
-		
+	wf.close()
+	
 	return (info, BLOCKS_NAME_TO_ID, blockgfx, world)
 
+
+
+# returns a parsed level (as returned by parseWorld) in the compiled format as bytes
+def compileWorld(level):
+	info, BLOCKS_NAME_TO_ID, blockgfx, world = level
+	meta = json.dumps([info, BLOCKS_NAME_TO_ID, [[k, v] for k, v in blockgfx.items()]]).encode("utf-8")
+	lengths = array('H', [len(row) for row in world])
+	cells = array('b')
+	for row in world:
+		cells.extend(row)
+	if sys.byteorder != "little":
+		lengths.byteswap()
+	return struct.pack(COMPILED_LEVEL_FORMAT, len(meta), len(world)) + meta + lengths.tobytes() + cells.tobytes()
+
+
+
+# returns the level (as returned by parseWorld) from a compiled level (bytes, or any buffer, e.g. a part of a memory map)
+# returns None if the data is incomplete
+def decompileWorld(data):
+	data = memoryview(data)
+	metaLength, rowCount = struct.unpack_from(COMPILED_LEVEL_FORMAT, data)
+	start = COMPILED_LEVEL_SIZE + metaLength
+	info, BLOCKS_NAME_TO_ID, blockgfx = json.loads(data[COMPILED_LEVEL_SIZE:start].tobytes().decode("utf-8"))
+	lengths = array('H')
+	lengths.frombytes(data[start:start + 2 * rowCount])
+	if sys.byteorder != "little":
+		lengths.byteswap()
+	cells = array('b')
+	cells.frombytes(data[start + 2 * rowCount:])
+	if len(cells) != sum(lengths):
+		return None
+	cells = cells.tolist()
+	world = list()
+	start = 0
+	for length in lengths:
+		world.append(cells[start:start + length])
+		start = start + length
+	return (info, BLOCKS_NAME_TO_ID, {int(k): v for k, v in blockgfx}, world)
+
+
+
+# writes a parsed level (as returned by parseWorld) to the given path (stat: os.stat of the level file)
+def saveCompiledWorld(path, level, stat):
+	data = compileWorld(level)
+	directory = os.path.dirname(path)
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	tmp = "{}.{}.tmp".format(path, os.getpid())
+	f = open(tmp, "wb")
+	f.write(struct.pack(COMPILED_HEADER_FORMAT, COMPILED_MAGIC, COMPILED_VERSION, stat.st_mtime_ns, stat.st_size))
+	f.write(data)
+	f.close()
+	os.replace(tmp, path) # other processes never see a half written file
+
+
+
+# reads a compiled level, returns None if it doesn't exist or is outdated (stat: os.stat of the level file)
+def loadCompiledWorld(path, stat):
+	if not isfile(path):
+		return None
+	f = open(path, "rb")
+	try:
+		header = f.read(COMPILED_HEADER_SIZE)
+		if len(header) < COMPILED_HEADER_SIZE:
+			return None
+		magic, version, mtime, size = struct.unpack(COMPILED_HEADER_FORMAT, header)
+		if (magic != COMPILED_MAGIC) or (version != COMPILED_VERSION) or (mtime != stat.st_mtime_ns) or (size != stat.st_size):
+			return None
+		data = f.read()
+	finally:
+		f.close()
+	if len(data) < COMPILED_LEVEL_SIZE:
+		return None
+	return decompileWorld(data)
+
+
+
+# main
+# compiles the given level files in advance (otherwise this happens when they are loaded the first time)
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: python worldSaver.py <level> [<level> ...]")
+		sys.exit(1)
+	for level in sys.argv[1:]:
+		loadWorld(level)
+	print("{} levels compiled.".format(len(sys.argv) - 1))
+